@@ -0,0 +1,111 @@
+"""Lock contention benchmark for warning writes in ModerationStore.
+
+Simulates a raid hitting many chats at once: worker threads record warnings
+in random chats while also checking ``is_chat_moderated`` and reading counts,
+and an admin thread keeps editing the global keyword list. Each configuration
+runs on a fresh temporary store and reports throughput and the wait counters
+of the global lock and the per-chat lock stripes. ``0`` stripes keeps
+warnings under the global lock, i.e. the behaviour before striping.
+
+Usage::
+
+    python benchmarks/bench_locks.py --workers 6 --chats 50 --ops 2000 --stripes 0,16
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.data_store import STORAGE_MODES, ModerationStore  # noqa: E402
+
+
+def run_raid(
+    mode: str,
+    stripes: int,
+    workers: int,
+    chats: int,
+    ops: int,
+    keywords: int,
+    seed: int,
+) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory() as directory:
+        store = ModerationStore(str(Path(directory) / "state.json"), mode=mode, lock_stripes=stripes)
+        chat_ids = [-1000 - i for i in range(chats)]
+        for chat_id in chat_ids:
+            store.add_chat(chat_id)
+        store.add_keywords([f"слово{i}" for i in range(keywords)])
+        barrier = threading.Barrier(workers + 1)
+        done = threading.Event()
+
+        def admin() -> None:
+            # Every edit recompiles the global matcher under the global lock
+            toggle = 0
+            while not done.is_set():
+                if toggle % 2:
+                    store.remove_keywords(["рейд"])
+                else:
+                    store.add_keywords(["рейд"])
+                toggle += 1
+
+        def worker(index: int) -> None:
+            rng = random.Random(seed + index)
+            barrier.wait()
+            for _ in range(ops):
+                chat_id = rng.choice(chat_ids)
+                user_id = rng.randint(1, 10_000)
+                if store.is_chat_moderated(chat_id):
+                    store.increment_warning(chat_id, user_id)
+                    store.get_warning(chat_id, user_id)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        admin_thread = threading.Thread(target=admin)
+        barrier.wait()
+        started = time.perf_counter()
+        admin_thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        admin_thread.join()
+        stats = store.lock_stats()
+        store.close()
+    return {"ops_per_sec": workers * ops / elapsed if elapsed else 0.0, "locks": stats}
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", default="wal", choices=STORAGE_MODES, help="storage mode of the store")
+    parser.add_argument("--workers", type=int, default=6, help="concurrent worker threads")
+    parser.add_argument("--chats", type=int, default=50, help="chats under attack")
+    parser.add_argument("--ops", type=int, default=2000, help="warnings recorded per worker")
+    parser.add_argument("--keywords", type=int, default=2000, help="global keywords recompiled on each admin edit")
+    parser.add_argument("--stripes", default="0,16", help="comma-separated stripe counts to compare (0 = global lock)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(list(argv) or None)
+
+    header = f"{'stripes':>8} {'ops/s':>10} {'lock':<7} {'acquired':>9} {'waited':>8} {'wait ms':>10} {'max ms':>8}"
+    print(f"mode={args.mode} workers={args.workers} chats={args.chats} ops={args.ops} seed={args.seed}")
+    print(header)
+    print("-" * len(header))
+    for stripes in (int(x) for x in args.stripes.split(",") if x.strip()):
+        result = run_raid(args.mode, stripes, args.workers, args.chats, args.ops, args.keywords, args.seed)
+        for name, stats in result["locks"].items():
+            print(
+                f"{stripes:>8} {result['ops_per_sec']:>10.0f} {name:<7} {stats['acquisitions']:>9} "
+                f"{stats['contended']:>8} {stats['wait_ms']:>10.1f} {stats['max_wait_ms']:>8.2f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
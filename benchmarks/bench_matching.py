@@ -0,0 +1,178 @@
+"""Throughput benchmark for the keyword matching path of ModerationBot.
+
+Generates reproducible Russian chat traffic and keyword lists, then runs every
+matching strategy over the same messages and reports messages/sec, p50/p99
+latency and the memory held by the compiled keyword structure.
+
+Usage::
+
+    python benchmarks/bench_matching.py --keywords 10,1000,100000 --messages 5000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.keyword_matcher import KeywordMatcher  # noqa: E402
+from bot.matcher_engines import ENGINES, build_engine  # noqa: E402
+
+
+Matcher = Callable[[str], Sequence[str]]
+
+_SYLLABLES = (
+    "ка", "ло", "ми", "ну", "пре", "вет", "до", "ро", "жи", "зна", "ком", "при",
+    "ста", "ру", "се", "го", "дня", "по", "то", "ли", "ва", "ны", "тель", "ность",
+    "ска", "жу", "ещё", "про", "за", "бы", "ли", "мо", "ре", "чат", "под", "пис",
+)
+_FILLER_WORDS = (
+    "привет", "как", "дела", "сегодня", "завтра", "подписка", "взаимно", "канал",
+    "спасибо", "ребята", "кто", "где", "когда", "очень", "хорошо", "давайте",
+    "группа", "ссылка", "новости", "вопрос", "ответ", "сейчас", "вечером", "да", "нет",
+)
+
+
+def _make_word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(syllables))
+
+
+def generate_keywords(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    keywords: Dict[str, None] = {}
+    while len(keywords) < count:
+        keywords.setdefault(_make_word(rng, rng.randint(2, 4)), None)
+    return list(keywords)
+
+
+def generate_messages(count: int, length: int, spam_ratio: float, keywords: Sequence[str], seed: int) -> List[str]:
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words: List[str] = []
+        while sum(len(w) + 1 for w in words) < length:
+            words.append(rng.choice(_FILLER_WORDS) if rng.random() < 0.7 else _make_word(rng, rng.randint(1, 3)))
+        if keywords and rng.random() < spam_ratio:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords).upper() if rng.random() < 0.3 else rng.choice(keywords))
+        messages.append(" ".join(words)[: max(length, 1)])
+    return messages
+
+
+def build_naive(keywords: Sequence[str]) -> Matcher:
+    """The original per-keyword substring scan from ``_handle_moderation``."""
+    keywords = list(keywords)
+
+    def match(text: str) -> Sequence[str]:
+        text_cf = text.casefold()
+        return [kw for kw in keywords if kw.casefold() in text_cf]
+
+    return match
+
+
+def build_aho_corasick(keywords: Sequence[str]) -> Matcher:
+    return KeywordMatcher(keywords).matched_keywords
+
+
+def _engine_strategy(name: str) -> Callable[[Sequence[str]], Matcher]:
+    """Wrap a :mod:`bot.matcher_engines` engine as the bot runs it (normalization included)."""
+
+    def build(keywords: Sequence[str]) -> Matcher:
+        matcher = KeywordMatcher(keywords)
+        engine = build_engine(name, matcher)
+        if engine is None:
+            raise ValueError(f"engine {name} does not support {len(keywords)} keywords")
+        matcher.use_engine(engine)
+        return matcher.matched_keywords
+
+    return build
+
+
+STRATEGIES: Dict[str, Callable[[Sequence[str]], Matcher]] = {
+    "naive": build_naive,
+    "aho-corasick": build_aho_corasick,
+}
+STRATEGIES.update((f"engine:{name}", _engine_strategy(name)) for name in ENGINES if name != "aho-corasick")
+
+
+def _percentile(sorted_values: Sequence[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_strategy(name: str, keywords: Sequence[str], messages: Sequence[str]) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    build_start = time.perf_counter()
+    matcher = STRATEGIES[name](keywords)
+    build_seconds = time.perf_counter() - build_start
+    memory_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies: List[float] = []
+    hits = 0
+    clock = time.perf_counter_ns
+    started = clock()
+    for text in messages:
+        t0 = clock()
+        if matcher(text):
+            hits += 1
+        latencies.append((clock() - t0) / 1000.0)
+    elapsed = (clock() - started) / 1e9
+    latencies.sort()
+    return {
+        "build_ms": build_seconds * 1000.0,
+        "msgs_per_sec": len(messages) / elapsed if elapsed else float("inf"),
+        "p50_us": statistics.median(latencies) if latencies else 0.0,
+        "p99_us": _percentile(latencies, 99),
+        "memory_kib": memory_bytes / 1024.0,
+        "hits": hits,
+    }
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keywords", default="10,100,1000,10000,100000", help="comma-separated keyword-list sizes")
+    parser.add_argument("--messages", type=int, default=2000, help="messages per run")
+    parser.add_argument("--length", type=int, default=80, help="approximate message length in characters")
+    parser.add_argument("--spam-ratio", type=float, default=0.2, help="share of messages containing a keyword")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES), help="comma-separated strategy names")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(list(argv) or None)
+
+    strategies = [name.strip() for name in args.strategies.split(",") if name.strip()]
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(unknown)} (known: {', '.join(STRATEGIES)})")
+
+    header = f"{'keywords':>9} {'strategy':<16} {'build ms':>10} {'msgs/s':>10} {'p50 us':>9} {'p99 us':>9} {'mem KiB':>10} {'hits':>6}"
+    print(f"messages={args.messages} length={args.length} spam_ratio={args.spam_ratio} seed={args.seed}")
+    print(header)
+    print("-" * len(header))
+    for size in (int(x) for x in args.keywords.split(",") if x.strip()):
+        keywords = generate_keywords(size, args.seed)
+        messages = generate_messages(args.messages, args.length, args.spam_ratio, keywords, args.seed + 1)
+        for name in strategies:
+            try:
+                result = run_strategy(name, keywords, messages)
+            except ValueError as exc:
+                tracemalloc.stop()
+                print(f"{size:>9} {name:<16} skipped: {exc}")
+                continue
+            print(
+                f"{size:>9} {name:<16} {result['build_ms']:>10.1f} {result['msgs_per_sec']:>10.0f} "
+                f"{result['p50_us']:>9.1f} {result['p99_us']:>9.1f} {result['memory_kib']:>10.0f} {result['hits']:>6}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
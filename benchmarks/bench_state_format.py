@@ -0,0 +1,107 @@
+"""Save/load benchmark of the JSON and binary state formats of ModerationStore.
+
+Generates a synthetic state (chats with their own keywords and many warned
+users), then for each format reports the file size, the time to write a
+snapshot once every chat's warnings are decoded, the time to read the file
+(warnings left undecoded) and the time to read it and decode the warnings
+of every chat. Matcher compilation is not included.
+
+Usage::
+
+    python benchmarks/bench_state_format.py --chats 2000 --users 200 --keywords 500
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.data_store import STATE_FORMATS, ModerationStore  # noqa: E402
+from bot.state_reader import decode_warnings, read_state  # noqa: E402
+
+
+def build_state(chats: int, users: int, keywords: int, seed: int) -> Dict[str, object]:
+    rng = random.Random(seed)
+    now = int(time.time())
+    return {
+        "moderated_chats": {
+            str(-1_000_000_000_000 - i): {
+                "title": f"Чат номер {i}",
+                "keywords": [f"чатслово{i}_{k}" for k in range(3)],
+                "warnings": {
+                    str(rng.randint(10_000, 7_000_000_000)): sorted(
+                        now - rng.randint(0, 90 * 86400) for _ in range(rng.randint(1, 3))
+                    )
+                    for _ in range(users)
+                },
+            }
+            for i in range(chats)
+        },
+        "global_keywords": [f"слово{i}" for i in range(keywords)],
+        "global_exceptions": [],
+    }
+
+
+def run_format(state_format: str, source: Path, directory: Path) -> Dict[str, float]:
+    path = directory / f"state.{state_format}"
+    path.write_bytes(source.read_bytes())
+    # Rewrite the JSON source in this format, then reopen it
+    store = ModerationStore(str(path), state_format=state_format)
+    store._flush_snapshot()
+    store.close()
+    store = ModerationStore(str(path), state_format=state_format)
+    store.list_chats()
+    started = time.perf_counter()
+    store._flush_snapshot()
+    save = time.perf_counter() - started
+    store.close()
+
+    started = time.perf_counter()
+    read_state(path)
+    load = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _, raw_warnings = read_state(path)
+    for raw in raw_warnings.values():
+        decode_warnings(raw)
+    load_all = time.perf_counter() - started
+    return {"size": path.stat().st_size, "save": save, "load": load, "load_all": load_all}
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=2000, help="moderated chats")
+    parser.add_argument("--users", type=int, default=200, help="warned users per chat")
+    parser.add_argument("--keywords", type=int, default=500, help="global keywords")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(list(argv) or None)
+
+    header = f"{'format':<8} {'size KiB':>10} {'save ms':>9} {'load ms':>9} {'load+decode ms':>15}"
+    print(f"chats={args.chats} users={args.users} keywords={args.keywords} seed={args.seed}")
+    print(header)
+    print("-" * len(header))
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        source = directory / "source.json"
+        source.write_text(
+            json.dumps(build_state(args.chats, args.users, args.keywords, args.seed), ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        for state_format in STATE_FORMATS:
+            result = run_format(state_format, source, directory)
+            print(
+                f"{state_format:<8} {result['size'] / 1024:>10.0f} {result['save'] * 1000:>9.1f} "
+                f"{result['load'] * 1000:>9.1f} {result['load_all'] * 1000:>15.1f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,8 +1,27 @@
 """Moderation bot package."""
 
 __all__ = [
+    "binary_state",
+    "categories",
     "config",
     "data_store",
+    "sqlite_store",
+    "state_reader",
+    "store_base",
+    "wal",
+    "flusher",
+    "locks",
+    "keyword_matcher",
+    "flat_automaton",
+    "matcher_engines",
+    "fuzzy_matcher",
+    "regex_matcher",
+    "word_matcher",
+    "stemming",
+    "near_duplicate",
+    "verdict_cache",
+    "warning_expiry",
     "telegram_api",
+    "text_normalize",
     "moderation_bot",
 ]
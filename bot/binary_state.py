@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import Dict, List, Sequence, Tuple, Union
+
+
+MAGIC = b"MSTB"
+# Bump whenever the section layout changes
+FORMAT_VERSION = 2
+# magic, version, WAL sequence folded into the snapshot
+_HEADER = struct.Struct("<4sIQ")
+# section tag, payload length
+_SECTION = struct.Struct("<4sQ")
+_COUNT = struct.Struct("<I")
+_CRC = struct.Struct("<I")
+
+# Warnings of one chat: user id -> issue times, or still packed as read from disk
+Warnings = Union[Dict[int, List[int]], bytes]
+
+
+def is_binary_state(blob: bytes) -> bool:
+    return blob[:len(MAGIC)] == MAGIC
+
+
+def _pack_strings(values: Sequence[str]) -> bytes:
+    blobs = [value.encode("utf-8") for value in values]
+    count = len(blobs)
+    return b"".join([struct.pack(f"<I{count}I", count, *map(len, blobs))] + blobs)
+
+
+def _unpack_strings(view: memoryview, offset: int) -> Tuple[List[str], int]:
+    (count,) = _COUNT.unpack_from(view, offset)
+    offset += _COUNT.size
+    lengths = struct.unpack_from(f"<{count}I", view, offset)
+    offset += 4 * count
+    values = []
+    for length in lengths:
+        values.append(str(view[offset:offset + length], "utf-8"))
+        offset += length
+    return values, offset
+
+
+def _pack_pairs(mapping: Dict[str, str]) -> bytes:
+    return _pack_strings([item for pair in mapping.items() for item in pair])
+
+
+def _unpack_pairs(view: memoryview) -> Dict[str, str]:
+    values, _ = _unpack_strings(view, 0)
+    return dict(zip(values[::2], values[1::2]))
+
+
+def pack_warnings(warnings: Dict[int, List[int]]) -> bytes:
+    """Pack one chat's warnings: user count, user ids, per-user counts, issue times."""
+    count = len(warnings)
+    counts = [len(times) for times in warnings.values()]
+    times = [issued_at for user_times in warnings.values() for issued_at in user_times]
+    return struct.pack(f"<I{count}q{count}I{len(times)}I", count, *warnings.keys(), *counts, *times)
+
+
+def unpack_warnings(raw: bytes) -> Dict[int, List[int]]:
+    """Decode one chat's packed warnings into ``user_id -> ascending issue times``."""
+    (count,) = _COUNT.unpack_from(raw)
+    user_ids = struct.unpack_from(f"<{count}q", raw, _COUNT.size)
+    counts = struct.unpack_from(f"<{count}I", raw, _COUNT.size + 8 * count)
+    times = struct.unpack_from(f"<{sum(counts)}I", raw, _COUNT.size + 12 * count)
+    result: Dict[int, List[int]] = {}
+    start = 0
+    for user_id, user_count in zip(user_ids, counts):
+        result[user_id] = list(times[start:start + user_count])
+        start += user_count
+    return result
+
+
+def _pack_chats(chats: Dict[str, Dict[str, object]]) -> bytes:
+    ids = [int(chat_id_str) for chat_id_str in chats]
+    entries = list(chats.values())
+    keywords = [list(entry.get("keywords") or []) for entry in entries]
+    count = len(ids)
+    return b"".join([
+        struct.pack(f"<I{count}q", count, *ids),
+        _pack_strings([entry.get("title") or "" for entry in entries]),
+        # Empty match mode: the chat never set one
+        _pack_strings([entry.get("match_mode") or "" for entry in entries]),
+        struct.pack(f"<{count}I", *map(len, keywords)),
+        _pack_strings([word for words in keywords for word in words]),
+    ])
+
+
+def _unpack_chats(view: memoryview) -> Dict[str, Dict[str, object]]:
+    (count,) = _COUNT.unpack_from(view, 0)
+    offset = _COUNT.size
+    ids = struct.unpack_from(f"<{count}q", view, offset)
+    offset += 8 * count
+    titles, offset = _unpack_strings(view, offset)
+    modes, offset = _unpack_strings(view, offset)
+    keyword_counts = struct.unpack_from(f"<{count}I", view, offset)
+    offset += 4 * count
+    words, _ = _unpack_strings(view, offset)
+    chats: Dict[str, Dict[str, object]] = {}
+    start = 0
+    for chat_id, title, mode, keyword_count in zip(ids, titles, modes, keyword_counts):
+        entry: Dict[str, object] = {"title": title, "keywords": words[start:start + keyword_count]}
+        if mode:
+            entry["match_mode"] = mode
+        chats[str(chat_id)] = entry
+        start += keyword_count
+    return chats
+
+
+def _pack_warning_section(warnings: Dict[int, Warnings]) -> bytes:
+    packed = [raw if isinstance(raw, bytes) else pack_warnings(raw) for raw in warnings.values()]
+    count = len(packed)
+    sizes = [len(raw) for raw in packed]
+    return b"".join([struct.pack(f"<I{count}q{count}I", count, *warnings.keys(), *sizes)] + packed)
+
+
+def _unpack_warning_section(view: memoryview) -> Dict[int, bytes]:
+    (count,) = _COUNT.unpack_from(view, 0)
+    offset = _COUNT.size
+    ids = struct.unpack_from(f"<{count}q", view, offset)
+    offset += 8 * count
+    sizes = struct.unpack_from(f"<{count}I", view, offset)
+    offset += 4 * count
+    result: Dict[int, bytes] = {}
+    for chat_id, size in zip(ids, sizes):
+        end = offset + size
+        # A block with no users is just its zero user count
+        if size > _COUNT.size:
+            result[chat_id] = bytes(view[offset:end])
+        offset = end
+    return result
+
+
+def encode_state(data: Dict[str, object], warnings: Dict[int, Warnings], wal_seq: int = 0) -> bytes:
+    """Serialize moderation state into the binary snapshot format.
+
+    Layout: a header (magic, format version, WAL sequence), then
+    length-prefixed sections ``KEYW`` (global keywords), ``EXCP`` (global
+    exceptions), ``CATG`` (category actions), ``KCAT`` (keyword categories),
+    ``CHAT`` (chat ids, titles, match modes and keyword lists as columns)
+    and ``WARN`` (per chat, a block of packed ``int64`` user ids, ``uint32``
+    per-user counts and ``uint32`` issue times, see :func:`pack_warnings`),
+    and a trailing CRC32 of everything before it. All integers are
+    little-endian; strings are UTF-8 behind a table of byte lengths.
+    Packed warnings are passed through as ``bytes`` if never decoded.
+    """
+    sections = (
+        (b"KEYW", _pack_strings(data.get("global_keywords") or [])),
+        (b"EXCP", _pack_strings(data.get("global_exceptions") or [])),
+        (b"CATG", _pack_pairs(data.get("categories") or {})),
+        (b"KCAT", _pack_pairs(data.get("keyword_categories") or {})),
+        (b"CHAT", _pack_chats(data.get("moderated_chats") or {})),
+        (b"WARN", _pack_warning_section(warnings)),
+    )
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, wal_seq)]
+    for tag, payload in sections:
+        parts.append(_SECTION.pack(tag, len(payload)))
+        parts.append(payload)
+    body = b"".join(parts)
+    return body + _CRC.pack(zlib.crc32(body))
+
+
+def decode_state(blob: bytes) -> Tuple[Dict[str, object], Dict[int, bytes]]:
+    """Inverse of :func:`encode_state`.
+
+    Returns the state in the shape of the JSON document (with ``wal_seq``
+    but without warnings) and each chat's still-packed warnings. Raises
+    ``ValueError`` on a foreign, other-version or corrupted file.
+    """
+    if len(blob) < _HEADER.size + _CRC.size or not is_binary_state(blob):
+        raise ValueError("Not a binary moderation state")
+    (crc,) = _CRC.unpack_from(blob, len(blob) - _CRC.size)
+    view = memoryview(blob)[:len(blob) - _CRC.size]
+    if zlib.crc32(view) != crc:
+        raise ValueError("Binary moderation state checksum mismatch")
+    _, version, wal_seq = _HEADER.unpack_from(view)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported binary state version {version}")
+    sections: Dict[bytes, memoryview] = {}
+    offset = _HEADER.size
+    empty = memoryview(_COUNT.pack(0))
+    try:
+        while offset < len(view):
+            tag, length = _SECTION.unpack_from(view, offset)
+            offset += _SECTION.size
+            sections[tag] = view[offset:offset + length]
+            offset += length
+        data: Dict[str, object] = {
+            "moderated_chats": _unpack_chats(sections.get(b"CHAT", empty)),
+            "global_keywords": _unpack_strings(sections.get(b"KEYW", empty), 0)[0],
+            "global_exceptions": _unpack_strings(sections.get(b"EXCP", empty), 0)[0],
+            "categories": _unpack_pairs(sections.get(b"CATG", empty)),
+            "keyword_categories": _unpack_pairs(sections.get(b"KCAT", empty)),
+            "wal_seq": wal_seq,
+        }
+        warnings = _unpack_warning_section(sections.get(b"WARN", empty))
+    except (struct.error, UnicodeDecodeError) as exc:
+        raise ValueError(f"Malformed binary moderation state: {exc}") from exc
+    return data, warnings
+
+
+__all__ = [
+    "FORMAT_VERSION",
+    "MAGIC",
+    "decode_state",
+    "encode_state",
+    "is_binary_state",
+    "pack_warnings",
+    "unpack_warnings",
+]
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+
+# What happens to the author of a keyword hit, from mildest to harshest
+KEYWORD_ACTIONS = ("delete", "warn", "mute", "ban")
+# Uncategorized keywords keep the original behaviour: delete and warn
+DEFAULT_ACTION = "warn"
+# Built-in categories; their actions can be changed with /set_category
+DEFAULT_CATEGORIES: Dict[str, str] = {
+    "profanity": "warn",
+    "adult": "delete",
+    "advertising": "delete",
+}
+
+
+def category_error(name: str, action: Optional[str] = None) -> Optional[str]:
+    """Return why a category name/action pair is invalid, or None."""
+    if not name or any(ch.isspace() or ch == "," for ch in name):
+        return "название категории должно быть одним словом без запятых"
+    if action is not None and action not in KEYWORD_ACTIONS:
+        return "действие должно быть одним из: " + ", ".join(KEYWORD_ACTIONS)
+    return None
+
+
+__all__ = ["DEFAULT_ACTION", "DEFAULT_CATEGORIES", "KEYWORD_ACTIONS", "category_error"]
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass, field
-from typing import Optional, Set
+from typing import Optional, Set, Tuple
 
 
 class ConfigError(RuntimeError):
@@ -41,6 +41,20 @@ def _get_int_env(name: str, default: int) -> int:
     return int(value)
 
 
+def _get_choice_env(name: str, default: str, choices: Tuple[str, ...]) -> str:
+    """Read a lowercase enum-like env var, rejecting unknown values."""
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    value = raw.strip()
+    if "#" in value:
+        value = value.split("#", 1)[0].strip()
+    value = value.lower()
+    if value not in choices:
+        raise ConfigError(f"{name} must be one of: {', '.join(choices)}")
+    return value
+
+
 @dataclass(frozen=True)
 class BotConfig:
     token: str
@@ -52,6 +66,23 @@ class BotConfig:
     storage_path: str = "moderation_state.json"
     rl_window_seconds: int = 60
     rl_max_messages: int = 10
+    storage_backend: str = "json"
+    sqlite_path: str = "moderation_state.sqlite3"
+    storage_mode: str = "snapshot"
+    state_format: str = "json"
+    wal_compact_bytes: int = 1024 * 1024
+    durability: str = "none"
+    flush_interval_ms: int = 500
+    flush_max_pending: int = 100
+    verdict_cache_size: int = 4096
+    dup_chat_threshold: int = 0
+    dup_window_seconds: int = 60
+    dup_max_entries: int = 10000
+    dup_min_words: int = 5
+    matcher_engine: str = "auto"
+    fuzzy_distance: int = 0
+    mute_seconds: int = 3600
+    warning_ttl_days: int = 0
 
     @staticmethod
     def from_env(prefix: str = "BOT_") -> "BotConfig":
@@ -73,6 +104,28 @@ class BotConfig:
         storage_path = os.getenv(f"{prefix}STORAGE_PATH", "moderation_state.json").strip()
         rl_window_seconds = _get_int_env(f"{prefix}RL_WINDOW_SECONDS", 60)
         rl_max_messages = _get_int_env(f"{prefix}RL_MAX_MESSAGES", 10)
+        storage_backend = _get_choice_env(f"{prefix}STORAGE_BACKEND", "json", ("json", "sqlite"))
+        sqlite_path = os.getenv(f"{prefix}SQLITE_PATH", "moderation_state.sqlite3").strip()
+        storage_mode = _get_choice_env(f"{prefix}STORAGE_MODE", "snapshot", ("snapshot", "wal", "group"))
+        state_format = _get_choice_env(f"{prefix}STATE_FORMAT", "json", ("json", "binary"))
+        wal_compact_bytes = _get_int_env(f"{prefix}WAL_COMPACT_BYTES", 1024 * 1024)
+        durability = _get_choice_env(
+            f"{prefix}DURABILITY", "none", ("none", "fsync_on_flush", "fsync_per_write")
+        )
+        flush_interval_ms = _get_int_env(f"{prefix}FLUSH_INTERVAL_MS", 500)
+        flush_max_pending = _get_int_env(f"{prefix}FLUSH_MAX_PENDING", 100)
+        verdict_cache_size = _get_int_env(f"{prefix}VERDICT_CACHE_SIZE", 4096)
+        dup_chat_threshold = _get_int_env(f"{prefix}DUP_CHAT_THRESHOLD", 0)
+        dup_window_seconds = _get_int_env(f"{prefix}DUP_WINDOW_SECONDS", 60)
+        dup_max_entries = _get_int_env(f"{prefix}DUP_MAX_ENTRIES", 10000)
+        dup_min_words = _get_int_env(f"{prefix}DUP_MIN_WORDS", 5)
+        # Typo tolerance beyond two edits matches too many ordinary words
+        fuzzy_distance = max(0, min(2, _get_int_env(f"{prefix}FUZZY_DISTANCE", 0)))
+        mute_seconds = _get_int_env(f"{prefix}MUTE_SECONDS", 3600)
+        warning_ttl_days = max(0, _get_int_env(f"{prefix}WARNING_TTL_DAYS", 0))
+        matcher_engine = _get_choice_env(
+            f"{prefix}MATCHER_ENGINE", "auto", ("auto", "aho-corasick", "naive", "regex", "token-set")
+        )
 
         return BotConfig(
             token=token,
@@ -84,6 +137,23 @@ class BotConfig:
             storage_path=storage_path,
             rl_window_seconds=rl_window_seconds,
             rl_max_messages=rl_max_messages,
+            storage_backend=storage_backend,
+            sqlite_path=sqlite_path,
+            storage_mode=storage_mode,
+            state_format=state_format,
+            wal_compact_bytes=wal_compact_bytes,
+            durability=durability,
+            flush_interval_ms=flush_interval_ms,
+            flush_max_pending=flush_max_pending,
+            verdict_cache_size=verdict_cache_size,
+            dup_chat_threshold=dup_chat_threshold,
+            dup_window_seconds=dup_window_seconds,
+            dup_max_entries=dup_max_entries,
+            dup_min_words=dup_min_words,
+            matcher_engine=matcher_engine,
+            fuzzy_distance=fuzzy_distance,
+            mute_seconds=mute_seconds,
+            warning_ttl_days=warning_ttl_days,
         )
 
 
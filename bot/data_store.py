@@ -1,20 +1,159 @@
 from __future__ import annotations
 
 import json
-import threading
+import logging
+import os
+import time
+from bisect import insort
+from contextlib import nullcontext
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import ContextManager, Dict, List, Optional, Tuple, Union
 
+from .binary_state import encode_state
+from .categories import DEFAULT_CATEGORIES
+from .flusher import DURABILITY_MODES, GroupCommitFlusher
+from .locks import StripedLock, TimedLock, lock_stats
+from .state_reader import decode_warnings, is_timestamped, read_state
+from .warning_expiry import ExpiryWheel, active_count, drop_expired
+from .store_base import BaseModerationStore, StoreSnapshot
+from .wal import WALCompactor, WriteAheadLog
 
-class ModerationStore:
-    """Thread-safe persistent storage for moderation state."""
 
-    def __init__(self, storage_path: str) -> None:
+logger = logging.getLogger(__name__)
+
+STORAGE_MODES = ("snapshot", "wal", "group")
+STATE_FORMATS = ("json", "binary")
+# Chats whose warnings are still undecoded that one expiry pass decodes and indexes
+_EXPIRY_DECODE_BATCH = 64
+
+
+def _extend_unique(current: List[str], words: List[str]) -> List[str]:
+    """Append words missing from ``current`` (case-insensitive); return the added ones."""
+    existing_cf = {w.casefold() for w in current}
+    added = []
+    for word in words:
+        if word.casefold() not in existing_cf:
+            existing_cf.add(word.casefold())
+            added.append(word)
+    current.extend(added)
+    return added
+
+
+def _remove_folded(current: List[str], targets: List[str]) -> int:
+    """Drop words matching ``targets`` case-insensitively; return how many were removed."""
+    to_remove_cf = {w.casefold() for w in targets}
+    before = len(current)
+    current[:] = [w for w in current if w.casefold() not in to_remove_cf]
+    return before - len(current)
+
+
+class ModerationStore(BaseModerationStore):
+    """Thread-safe JSON-file storage for moderation state.
+
+    In ``snapshot`` mode every mutation rewrites the JSON state file. In ``wal``
+    mode mutations append one record to ``<storage_path>.wal`` and a background
+    compactor folds the log into the JSON file once it grows past
+    ``wal_compact_bytes``. In ``group`` mode mutations only mark the state
+    dirty and a flusher thread writes coalesced snapshots every
+    ``flush_interval_ms`` or after ``flush_max_pending`` changes.
+
+    ``durability`` picks when data is forced to disk: ``none`` leaves it to the
+    OS, ``fsync_on_flush`` fsyncs every snapshot write (and the WAL on each
+    flusher tick), ``fsync_per_write`` makes each mutation return only once it
+    is on stable storage.
+
+    With ``warning_ttl`` set, each warning keeps its issue time and only
+    warnings younger than the TTL count. Every decoded warning is filed in
+    an :class:`ExpiryWheel`, so :meth:`expire_warnings` visits only the
+    users whose warnings expired.
+
+    Locking: ``_lock`` guards the keyword lists, the set of chats and
+    snapshot publication; warnings are guarded by ``_chat_locks`` striped by
+    chat_id, so warning writes in different chats do not wait for each other
+    (except in ``snapshot`` mode, where each write rewrites the whole file
+    under ``_lock``). Lock order is ``_lock`` before any stripe; writing a
+    snapshot of the state takes every stripe.
+    """
+
+    def __init__(
+        self,
+        storage_path: str,
+        mode: str = "snapshot",
+        wal_compact_bytes: int = 1024 * 1024,
+        durability: str = "none",
+        flush_interval_ms: int = 500,
+        flush_max_pending: int = 100,
+        fuzzy_distance: int = 0,
+        lock_stripes: int = 16,
+        state_format: str = "json",
+        warning_ttl: int = 0,
+    ) -> None:
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{mode}'")
+        if state_format not in STATE_FORMATS:
+            raise ValueError(f"Unknown state format '{state_format}'")
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode '{durability}'")
         self._path = Path(storage_path)
-        self._lock = threading.RLock()
-        self._data = {"moderated_chats": {}, "global_keywords": []}
+        self._mode = mode
+        self._state_format = state_format
+        self._warning_ttl = max(0, warning_ttl)
+        self._expiry = ExpiryWheel()
+        # Issue time given to warnings stored as bare counts by older versions
+        self._legacy_time = int(time.time())
+        self._durability = durability
+        self._wal_path = self._path.with_name(self._path.name + ".wal")
+        self._matcher_cache_path = self._path.with_name(self._path.name + ".matcher")
+        self._wal_compact_bytes = wal_compact_bytes
+        self._fuzzy_distance = fuzzy_distance
+        self._lock = TimedLock()
+        # 0 stripes keeps warnings under the global lock, as before striping
+        self._chat_locks = StripedLock(lock_stripes) if lock_stripes > 0 else None
+        self._data = {
+            "moderated_chats": {},
+            "global_keywords": [],
+            "global_exceptions": [],
+            "categories": {},
+            "keyword_categories": {},
+        }
+        # chat_id -> user_id -> ascending issue times, kept out of ``_data``
+        # with int keys; the JSON "warnings" objects are built only when serializing.
+        self._warnings: Dict[int, Dict[int, List[int]]] = {}
+        # chat_id -> warnings as read from disk (JSON text or packed arrays),
+        # decoded on first access
+        self._raw_warnings: Dict[int, Union[str, bytes]] = {}
+        # Sequence number of the last WAL record folded into the state file
+        self._wal_seq = 0
+        self._wal: Optional[WriteAheadLog] = None
+        self._compactor: Optional[WALCompactor] = None
+        self._flusher: Optional[GroupCommitFlusher] = None
         self._ensure_directory()
         self._load()
+        self._recover_wal()
+        self._snapshot: Optional[StoreSnapshot] = None
+        self._publish_snapshot(rebuild_matcher=True)
+        if self._mode == "wal":
+            self._wal = WriteAheadLog(self._wal_path, start_seq=self._wal_seq)
+            self._compactor = WALCompactor(self._compact)
+            if durability == "fsync_on_flush":
+                self._flusher = GroupCommitFlusher(self._wal.sync, flush_interval_ms, flush_max_pending)
+        elif self._mode == "group":
+            self._flusher = GroupCommitFlusher(self._flush_snapshot, flush_interval_ms, flush_max_pending)
+
+    def close(self) -> None:
+        if self._compactor is not None:
+            self._compactor.stop()
+            self._compactor = None
+        if self._flusher is not None:
+            # Stopping drains whatever is still pending.
+            self._flusher.stop()
+            self._flusher = None
+        if self._wal is not None:
+            self._compact()
+            self._wal.close()
+            self._wal = None
+        self._persist_matcher()
 
     def _ensure_directory(self) -> None:
         directory = self._path.parent
@@ -24,21 +163,203 @@ class ModerationStore:
     def _load(self) -> None:
         if not self._path.exists():
             return
+        raw_warnings: Dict[int, Union[str, bytes]] = {}
         try:
-            with self._path.open("r", encoding="utf-8") as fh:
-                self._data = json.load(fh)
-        except json.JSONDecodeError:
+            # Either format is accepted, so switching BOT_STATE_FORMAT converts on the next write
+            self._data, raw_warnings = read_state(self._path)
+        except ValueError as exc:
             # Keep defaults if file is corrupted.
-            pass
+            logger.warning("Ignoring unreadable state file %s: %s", self._path, exc)
         # Ensure required keys exist in loaded data
         self._data.setdefault("moderated_chats", {})
         self._data.setdefault("global_keywords", [])
+        self._data.setdefault("global_exceptions", [])
+        self._data.setdefault("categories", {})
+        self._data.setdefault("keyword_categories", {})
+        self._warnings = {}
+        self._raw_warnings = raw_warnings
+        self._wal_seq = int(self._data.pop("wal_seq", 0) or 0)
+        logger.info(
+            "Loaded %s chats from %s (warnings of %s chats deferred)",
+            len(self._data["moderated_chats"]), self._path, len(self._raw_warnings),
+        )
+
+    def _rotated_wal_paths(self) -> List[Path]:
+        rotated = []
+        for path in self._path.parent.glob(self._wal_path.name + ".*"):
+            suffix = path.name[len(self._wal_path.name) + 1:]
+            if suffix.isdigit():
+                rotated.append((int(suffix), path))
+        return [path for _, path in sorted(rotated)]
 
-    def _persist(self) -> None:
+    def _recover_wal(self) -> None:
+        logs = self._rotated_wal_paths()
+        if self._wal_path.exists():
+            logs.append(self._wal_path)
+        if not logs:
+            return
+        replayed = 0
+        for log_path in logs:
+            for record in WriteAheadLog.read(log_path, after_seq=self._wal_seq):
+                self._apply(record)
+                self._wal_seq = int(record["s"])
+                replayed += 1
+        if replayed:
+            logger.info("Replayed %s WAL records from %s", replayed, self._wal_path)
+        # Fold everything into the state file so the log starts empty.
+        self._persist(self._serialize())
+        for log_path in logs:
+            log_path.unlink(missing_ok=True)
+
+    def _serialize_warnings(self, chat_id: int) -> str:
+        raw = self._raw_warnings.get(chat_id)
+        if isinstance(raw, str) and is_timestamped(raw):
+            # Never accessed since loading: splice the stored object in as it is
+            return raw
+        # Legacy counts are written back as issue times, or they would be
+        # stamped with a new load time on every restart and never expire
+        warnings = decode_warnings(raw, self._legacy_time) if raw is not None else self._warnings.get(chat_id, {})
+        text = json.dumps({str(uid): times for uid, times in warnings.items()}, indent=2)
+        return text.replace("\n", "\n      ")
+
+    def _serialize_json(self) -> str:
+        # Laid out by hand, as json.dumps(..., indent=2) would, so that raw
+        # warnings text is spliced in rather than parsed and dumped again.
+        # Dumped JSON never holds a raw newline, so re-indenting is a replace.
+        chats = []
+        for chat_id_str, entry in self._data["moderated_chats"].items():
+            # "warnings" goes last, so its null is the tail of the dumped entry
+            fields = json.dumps(dict(entry, warnings=None), ensure_ascii=False, indent=2)[:-len("null\n}")]
+            head = f"{json.dumps(chat_id_str)}: {fields}".replace("\n", "\n    ")
+            chats.append(head + self._serialize_warnings(int(chat_id_str)) + "\n    }")
+        chats_text = "{\n    " + ",\n    ".join(chats) + "\n  }" if chats else "{}"
+        rest = {key: value for key, value in self._data.items() if key != "moderated_chats"}
+        if self._mode == "wal":
+            rest["wal_seq"] = self._wal_seq
+        tail = json.dumps(rest, ensure_ascii=False, indent=2)
+        return '{\n  "moderated_chats": ' + chats_text + (",\n" + tail[2:] if rest else "\n}")
+
+    def _serialize_binary(self) -> bytes:
+        warnings: Dict[int, Union[Dict[int, List[int]], bytes]] = {}
+        for chat_id, raw in self._raw_warnings.items():
+            # Packed warnings are copied as they are; JSON ones are decoded once
+            warnings[chat_id] = raw if isinstance(raw, bytes) else decode_warnings(raw, self._legacy_time)
+        warnings.update(self._warnings)
+        return encode_state(self._data, warnings, self._wal_seq if self._mode == "wal" else 0)
+
+    def _serialize(self) -> bytes:
+        if self._state_format == "binary":
+            return self._serialize_binary()
+        return self._serialize_json().encode("utf-8")
+
+    def _persist(self, payload: Optional[bytes] = None) -> None:
+        if payload is None:
+            payload = self._serialize()
+        fsync = self._durability != "none"
         tmp_path = self._path.with_suffix(".tmp")
-        with tmp_path.open("w", encoding="utf-8") as fh:
-            json.dump(self._data, fh, ensure_ascii=False, indent=2)
+        with tmp_path.open("wb") as fh:
+            fh.write(payload)
+            if fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
         tmp_path.replace(self._path)
+        if fsync:
+            self._fsync_directory()
+
+    def _fsync_directory(self) -> None:
+        # Make the rename itself durable; not supported on every platform.
+        try:
+            fd = os.open(str(self._path.parent), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _flush_snapshot(self) -> None:
+        # Serialize under the lock (CPU only), write outside it.
+        with self._lock, self._all_chat_locks():
+            payload = self._serialize()
+        self._persist(payload)
+
+    def _commit(self, record: Dict[str, object]) -> Optional[int]:
+        """Record a mutation; callers must hold ``self._lock``.
+
+        Returns a flusher generation the caller must pass to
+        :meth:`_await_durable` after releasing the lock, or None.
+        """
+        if self._wal is not None:
+            self._wal.append(record, fsync=self._durability == "fsync_per_write")
+            if self._wal.size >= self._wal_compact_bytes and self._compactor is not None:
+                self._compactor.request()
+        elif self._mode == "snapshot":
+            self._persist()
+            return None
+        if self._flusher is None:
+            return None
+        generation = self._flusher.mark_dirty()
+        if self._durability == "fsync_per_write":
+            return generation
+        return None
+
+    def _await_durable(self, generation: Optional[int]) -> None:
+        flusher = self._flusher
+        if generation is not None and flusher is not None:
+            flusher.wait_flushed(generation)
+
+    def _compact(self) -> None:
+        # Serialize and rotate under the lock so the snapshot and the rotated
+        # log split cleanly at one sequence number; disk I/O happens outside.
+        with self._lock, self._all_chat_locks():
+            if self._wal is None or not self._wal.size:
+                return
+            self._wal_seq = self._wal.seq
+            payload = self._serialize()
+            self._wal.rotate(self._wal_path.with_name(f"{self._wal_path.name}.{self._wal_seq}"))
+        self._persist(payload)
+        for log_path in self._rotated_wal_paths():
+            log_path.unlink(missing_ok=True)
+        logger.debug("Compacted WAL into %s at seq %s", self._path, self._wal_seq)
+
+    def _apply(self, record: Dict[str, object]) -> None:
+        op = record.get("op")
+        if op == "add_chat":
+            self._op_add_chat(int(record["c"]), record.get("t"))
+        elif op == "title":
+            self._op_update_chat_title(int(record["c"]), str(record["t"]))
+        elif op == "rm_chat":
+            self._op_remove_chat(int(record["c"]))
+        elif op == "kw_add":
+            self._op_add_keywords(list(record["w"]))
+        elif op == "kw_rm":
+            self._op_remove_keywords(list(record["w"]))
+        elif op == "ex_add":
+            self._op_add_exceptions(list(record["w"]))
+        elif op == "ex_rm":
+            self._op_remove_exceptions(list(record["w"]))
+        elif op == "ckw_add":
+            self._op_add_chat_keywords(int(record["c"]), list(record["w"]))
+        elif op == "ckw_rm":
+            self._op_remove_chat_keywords(int(record["c"]), list(record["w"]))
+        elif op == "cat_set":
+            self._op_set_category(str(record["n"]), str(record["a"]))
+        elif op == "cat_rm":
+            self._op_remove_category(str(record["n"]))
+        elif op == "cat_kw":
+            self._op_add_category_keywords(str(record["n"]), list(record["w"]))
+        elif op == "mode":
+            self._op_set_chat_match_mode(int(record["c"]), str(record["m"]))
+        elif op == "warn":
+            self._op_increment_warning(int(record["c"]), int(record["u"]), int(record["t"]))
+        elif op == "reset":
+            self._op_reset_warnings(int(record["c"]), int(record["u"]))
+        elif op == "expire":
+            self._op_expire_warnings(int(record["t"]))
+        else:
+            logger.warning("Skipping unknown WAL record %r", record)
 
     def _get_chat_entry(self, chat_id: int, create: bool = False) -> Optional[Dict[str, object]]:
         key = str(chat_id)
@@ -49,139 +370,414 @@ class ModerationStore:
                 {
                     "title": "",
                     "keywords": [],
-                    "warnings": {},
                 },
             )
         return chats.get(key)
 
+    def _op_add_chat(self, chat_id: int, title: Optional[str]) -> bool:
+        exists = self._get_chat_entry(chat_id) is not None
+        entry = self._get_chat_entry(chat_id, create=True)
+        if title is not None:
+            entry["title"] = title
+        return not exists
+
+    def _op_update_chat_title(self, chat_id: int, title: str) -> None:
+        entry = self._get_chat_entry(chat_id, create=True)
+        entry["title"] = title
+
+    def _chat_warnings(self, chat_id: int) -> Optional[Dict[int, List[int]]]:
+        """Return the warnings of ``chat_id``, decoding them if still raw.
+
+        Callers hold ``_warning_lock(chat_id)``.
+        """
+        warnings = self._warnings.get(chat_id)
+        if warnings is None:
+            raw = self._raw_warnings.pop(chat_id, None)
+            if raw is not None:
+                warnings = self._warnings[chat_id] = decode_warnings(raw, self._legacy_time)
+                if self._warning_ttl:
+                    for user_id, times in warnings.items():
+                        for issued_at in times:
+                            self._expiry.add((chat_id, user_id), issued_at)
+        return warnings
+
+    def _active_warnings(self, chat_id: int, cutoff: Optional[int]) -> Dict[int, int]:
+        result: Dict[int, int] = {}
+        for user_id, times in (self._chat_warnings(chat_id) or {}).items():
+            count = active_count(times, cutoff)
+            if count:
+                result[user_id] = count
+        return result
+
+    def _op_remove_chat(self, chat_id: int) -> bool:
+        self._warnings.pop(chat_id, None)
+        self._raw_warnings.pop(chat_id, None)
+        return self._data["moderated_chats"].pop(str(chat_id), None) is not None
+
+    def _op_add_keywords(self, cleaned: List[str]) -> List[str]:
+        return _extend_unique(self._data.setdefault("global_keywords", []), cleaned)
+
+    def _op_remove_keywords(self, targets: List[str]) -> int:
+        removed = _remove_folded(self._data.setdefault("global_keywords", []), targets)
+        if removed:
+            assigned: Dict[str, str] = self._data.setdefault("keyword_categories", {})
+            for word in targets:
+                assigned.pop(word.casefold(), None)
+        return removed
+
+    def _op_set_category(self, name: str, action: str) -> bool:
+        categories: Dict[str, str] = self._data.setdefault("categories", {})
+        created = name not in categories and name not in DEFAULT_CATEGORIES
+        categories[name] = action
+        return created
+
+    def _op_remove_category(self, name: str) -> bool:
+        removed = self._data.setdefault("categories", {}).pop(name, None) is not None
+        assigned: Dict[str, str] = self._data.setdefault("keyword_categories", {})
+        for folded in [folded for folded, category in assigned.items() if category == name]:
+            del assigned[folded]
+            removed = True
+        return removed
+
+    def _op_add_category_keywords(self, name: str, cleaned: List[str]) -> Tuple[List[str], int]:
+        added = _extend_unique(self._data.setdefault("global_keywords", []), cleaned)
+        assigned: Dict[str, str] = self._data.setdefault("keyword_categories", {})
+        changed = 0
+        for word in cleaned:
+            folded = word.casefold()
+            if assigned.get(folded) != name:
+                assigned[folded] = name
+                changed += 1
+        return added, changed
+
+    def _op_add_exceptions(self, cleaned: List[str]) -> List[str]:
+        return _extend_unique(self._data.setdefault("global_exceptions", []), cleaned)
+
+    def _op_remove_exceptions(self, targets: List[str]) -> int:
+        return _remove_folded(self._data.setdefault("global_exceptions", []), targets)
+
+    def _op_add_chat_keywords(self, chat_id: int, cleaned: List[str]) -> List[str]:
+        entry = self._get_chat_entry(chat_id)
+        if entry is None:
+            return []
+        return _extend_unique(entry.setdefault("keywords", []), cleaned)
+
+    def _op_remove_chat_keywords(self, chat_id: int, targets: List[str]) -> int:
+        entry = self._get_chat_entry(chat_id)
+        if entry is None:
+            return 0
+        return _remove_folded(entry.setdefault("keywords", []), targets)
+
+    def _op_set_chat_match_mode(self, chat_id: int, mode: str) -> bool:
+        entry = self._get_chat_entry(chat_id)
+        if entry is None:
+            return False
+        entry["match_mode"] = mode
+        return True
+
+    def _op_increment_warning(self, chat_id: int, user_id: int, issued_at: int) -> int:
+        self._get_chat_entry(chat_id, create=True)
+        warnings = self._chat_warnings(chat_id)
+        if warnings is None:
+            warnings = self._warnings[chat_id] = {}
+        times = warnings.get(user_id)
+        if times is None:
+            times = warnings[user_id] = []
+        drop_expired(times, self._warning_cutoff(issued_at))
+        insort(times, issued_at)
+        if self._warning_ttl:
+            self._expiry.add((chat_id, user_id), issued_at)
+        return len(times)
+
+    def _op_reset_warnings(self, chat_id: int, user_id: int) -> bool:
+        warnings = self._chat_warnings(chat_id)
+        if not warnings or warnings.pop(user_id, None) is None:
+            return False
+        if not warnings:
+            del self._warnings[chat_id]
+        return True
+
     def add_chat(self, chat_id: int, title: Optional[str] = None) -> bool:
-        key = str(chat_id)
         with self._lock:
-            chats = self._data.setdefault("moderated_chats", {})
-            exists = key in chats
-            entry = chats.setdefault(
-                key,
-                {
-                    "title": "",
-                    "keywords": [],
-                    "warnings": {},
-                },
-            )
-            if title is not None:
-                entry["title"] = title
-            self._persist()
-            return not exists
+            created = self._op_add_chat(chat_id, title)
+            self._publish_snapshot()
+            generation = self._commit({"op": "add_chat", "c": chat_id, "t": title})
+        self._await_durable(generation)
+        return created
 
     def update_chat_title(self, chat_id: int, title: str) -> None:
         with self._lock:
-            entry = self._get_chat_entry(chat_id, create=True)
-            entry["title"] = title
-            self._persist()
+            self._op_update_chat_title(chat_id, title)
+            self._publish_snapshot()
+            generation = self._commit({"op": "title", "c": chat_id, "t": title})
+        self._await_durable(generation)
 
     def remove_chat(self, chat_id: int) -> bool:
-        key = str(chat_id)
-        with self._lock:
-            removed = self._data["moderated_chats"].pop(key, None) is not None
-            if removed:
-                self._persist()
-            return removed
+        with self._lock, self._chat_lock(chat_id):
+            removed = self._op_remove_chat(chat_id)
+            if not removed:
+                return False
+            self._publish_snapshot()
+            generation = self._commit({"op": "rm_chat", "c": chat_id})
+        self._await_durable(generation)
+        return True
 
     def list_chats(self) -> Dict[int, Dict[str, object]]:
-        with self._lock:
+        cutoff = self._warning_cutoff()
+        with self._lock, self._all_chat_locks():
             result: Dict[int, Dict[str, object]] = {}
             global_keywords = list(self._data.get("global_keywords", []))
             for chat_id_str, payload in self._data["moderated_chats"].items():
                 result[int(chat_id_str)] = {
                     "title": payload.get("title", ""),
-                    # Report current global keywords for every chat (unified list)
-                    "keywords": list(global_keywords),
-                    "warnings": {int(uid): cnt for uid, cnt in payload.get("warnings", {}).items()},
+                    # Effective list: global keywords plus the chat's own overlay
+                    "keywords": global_keywords + list(payload.get("keywords") or []),
+                    "warnings": self._active_warnings(int(chat_id_str), cutoff),
                 }
             return result
 
-    def add_keyword(self, chat_id: int, keyword: str) -> bool:
-        # Backward compatibility: add to global list, ignore chat_id
-        return self.add_keywords([keyword]) > 0
-
     def add_keywords(self, words: List[str]) -> int:
         cleaned = [w.strip() for w in words if w and w.strip()]
         if not cleaned:
             return 0
         with self._lock:
-            current: List[str] = self._data.setdefault("global_keywords", [])
-            existing_cf = {w.casefold() for w in current}
-            added = [w for w in cleaned if w.casefold() not in existing_cf]
+            added = self._op_add_keywords(cleaned)
             if not added:
                 return 0
-            current.extend(added)
-            self._persist()
-            return len(added)
-
-    def remove_keyword(self, chat_id: int, keyword: str) -> bool:
-        return self.remove_keywords([keyword]) > 0
+            self._publish_snapshot(rebuild_matcher=True)
+            generation = self._commit({"op": "kw_add", "w": added})
+        self._await_durable(generation)
+        return len(added)
 
     def remove_keywords(self, words: List[str]) -> int:
         targets = [w.strip() for w in words if w and w.strip()]
         if not targets:
             return 0
         with self._lock:
-            current: List[str] = self._data.setdefault("global_keywords", [])
-            to_remove_cf = {w.casefold() for w in targets}
-            before = len(current)
-            current[:] = [w for w in current if w.casefold() not in to_remove_cf]
-            removed = before - len(current)
-            if removed:
-                self._persist()
-            return removed
-
-    def get_keywords(self, chat_id: int) -> List[str]:
-        # Backward compatibility: return global keywords for any chat
+            removed = self._op_remove_keywords(targets)
+            if not removed:
+                return 0
+            self._publish_snapshot(rebuild_matcher=True)
+            generation = self._commit({"op": "kw_rm", "w": targets})
+        self._await_durable(generation)
+        return removed
+
+    def add_exceptions(self, phrases: List[str]) -> int:
+        cleaned = [w.strip() for w in phrases if w and w.strip()]
+        if not cleaned:
+            return 0
         with self._lock:
-            return list(self._data.get("global_keywords", []))
+            added = self._op_add_exceptions(cleaned)
+            if not added:
+                return 0
+            self._publish_snapshot(rebuild_matcher=True)
+            generation = self._commit({"op": "ex_add", "w": added})
+        self._await_durable(generation)
+        return len(added)
 
-    def list_global_keywords(self) -> List[str]:
+    def remove_exceptions(self, phrases: List[str]) -> int:
+        targets = [w.strip() for w in phrases if w and w.strip()]
+        if not targets:
+            return 0
         with self._lock:
-            return list(self._data.get("global_keywords", []))
+            removed = self._op_remove_exceptions(targets)
+            if not removed:
+                return 0
+            self._publish_snapshot(rebuild_matcher=True)
+            generation = self._commit({"op": "ex_rm", "w": targets})
+        self._await_durable(generation)
+        return removed
 
-    def is_chat_moderated(self, chat_id: int) -> bool:
+    def add_chat_keywords(self, chat_id: int, words: List[str]) -> int:
+        cleaned = [w.strip() for w in words if w and w.strip()]
+        if not cleaned:
+            return 0
         with self._lock:
-            return str(chat_id) in self._data.get("moderated_chats", {})
+            added = self._op_add_chat_keywords(chat_id, cleaned)
+            if not added:
+                return 0
+            self._publish_snapshot(rebuild_chats=(chat_id,))
+            generation = self._commit({"op": "ckw_add", "c": chat_id, "w": added})
+        self._await_durable(generation)
+        return len(added)
 
-    def increment_warning(self, chat_id: int, user_id: int) -> int:
+    def remove_chat_keywords(self, chat_id: int, words: List[str]) -> int:
+        targets = [w.strip() for w in words if w and w.strip()]
+        if not targets:
+            return 0
         with self._lock:
-            entry = self._get_chat_entry(chat_id, create=True)
-            warnings: Dict[str, int] = entry.setdefault("warnings", {})
-            user_key = str(user_id)
-            warnings[user_key] = warnings.get(user_key, 0) + 1
-            self._persist()
-            return warnings[user_key]
+            removed = self._op_remove_chat_keywords(chat_id, targets)
+            if not removed:
+                return 0
+            self._publish_snapshot(rebuild_chats=(chat_id,))
+            generation = self._commit({"op": "ckw_rm", "c": chat_id, "w": targets})
+        self._await_durable(generation)
+        return removed
 
-    def reset_warnings(self, chat_id: int, user_id: int) -> bool:
+    def set_chat_match_mode(self, chat_id: int, mode: str) -> bool:
+        self._check_match_mode(mode)
         with self._lock:
-            entry = self._get_chat_entry(chat_id)
-            if not entry:
+            if not self._op_set_chat_match_mode(chat_id, mode):
                 return False
-            warnings: Dict[str, int] = entry.get("warnings", {})
-            if str(user_id) not in warnings:
+            # Rebuilding the chat bumps keyword_version, so cached verdicts for the old mode expire
+            self._publish_snapshot(rebuild_chats=(chat_id,))
+            generation = self._commit({"op": "mode", "c": chat_id, "m": mode})
+        self._await_durable(generation)
+        return True
+
+    def set_category(self, name: str, action: str) -> bool:
+        self._check_category(name, action)
+        with self._lock:
+            created = self._op_set_category(name, action)
+            self._publish_snapshot()
+            generation = self._commit({"op": "cat_set", "n": name, "a": action})
+        self._await_durable(generation)
+        return created
+
+    def remove_category(self, name: str) -> bool:
+        with self._lock:
+            if not self._op_remove_category(name):
                 return False
-            warnings.pop(str(user_id), None)
-            self._persist()
-            return True
+            self._publish_snapshot()
+            generation = self._commit({"op": "cat_rm", "n": name})
+        self._await_durable(generation)
+        return True
 
-    def get_warning(self, chat_id: int, user_id: int) -> int:
+    def add_category_keywords(self, name: str, words: List[str]) -> int:
+        cleaned = [w.strip() for w in words if w and w.strip()]
+        if not cleaned:
+            return 0
         with self._lock:
-            entry = self._get_chat_entry(chat_id)
-            if not entry:
+            self._require_category(name)
+            added, changed = self._op_add_category_keywords(name, cleaned)
+            if not changed:
                 return 0
-            warnings: Dict[str, int] = entry.get("warnings", {})
-            return int(warnings.get(str(user_id), 0))
+            self._publish_snapshot(rebuild_matcher=bool(added))
+            generation = self._commit({"op": "cat_kw", "n": name, "w": cleaned})
+        self._await_durable(generation)
+        return changed
+
+    def _publish_snapshot(self, rebuild_matcher: bool = False, rebuild_chats: Tuple[int, ...] = ()) -> None:
+        """Publish a new snapshot; callers must hold ``self._lock``."""
+        policies = {
+            int(chat_id_str): dict(payload)
+            for chat_id_str, payload in self._data.get("moderated_chats", {}).items()
+        }
+        self._set_snapshot(
+            self._data.get("global_keywords", []),
+            policies,
+            rebuild_matcher,
+            rebuild_chats,
+            exceptions=self._data.get("global_exceptions", []),
+            categories=self._data.get("categories", {}),
+            keyword_categories=self._data.get("keyword_categories", {}),
+        )
+
+    def _chat_lock(self, chat_id: int) -> TimedLock:
+        return self._chat_locks.for_key(chat_id) if self._chat_locks is not None else self._lock
+
+    def _all_chat_locks(self) -> ContextManager[object]:
+        return self._chat_locks.all() if self._chat_locks is not None else nullcontext()
+
+    def _warning_lock(self, chat_id: int) -> TimedLock:
+        # Snapshot mode persists the whole state on every write, which needs _lock
+        return self._lock if self._mode == "snapshot" else self._chat_lock(chat_id)
+
+    def increment_warning(self, chat_id: int, user_id: int) -> int:
+        count = None
+        issued_at = int(time.time())
+        record = {"op": "warn", "c": chat_id, "u": user_id, "t": issued_at}
+        if self._mode != "snapshot":
+            with self._chat_lock(chat_id):
+                # Re-checked under the stripe: remove_chat holds it while dropping the chat
+                if self._get_chat_entry(chat_id) is not None:
+                    count = self._op_increment_warning(chat_id, user_id, issued_at)
+                    generation = self._commit(record)
+        if count is None:
+            # Warning in an unknown chat registers it, which publishes a snapshot
+            with self._lock, self._chat_lock(chat_id):
+                created = self._get_chat_entry(chat_id) is None
+                count = self._op_increment_warning(chat_id, user_id, issued_at)
+                if created:
+                    self._publish_snapshot()
+                generation = self._commit(record)
+        self._await_durable(generation)
+        return count
+
+    def reset_warnings(self, chat_id: int, user_id: int) -> bool:
+        with self._warning_lock(chat_id):
+            if not self._op_reset_warnings(chat_id, user_id):
+                return False
+            generation = self._commit({"op": "reset", "c": chat_id, "u": user_id})
+        self._await_durable(generation)
+        return True
+
+    def get_warning(self, chat_id: int, user_id: int) -> int:
+        # Two dict lookups and a bisect; single dict reads need no lock
+        warnings = self._warnings.get(chat_id)
+        if warnings is None and chat_id in self._raw_warnings:
+            with self._warning_lock(chat_id):
+                warnings = self._chat_warnings(chat_id)
+        times = warnings.get(user_id) if warnings else None
+        return active_count(times, self._warning_cutoff()) if times else 0
 
     def get_all_warnings(self, chat_id: int) -> Dict[int, int]:
-        with self._lock:
-            entry = self._get_chat_entry(chat_id)
-            if not entry:
-                return {}
-            return {int(uid): cnt for uid, cnt in entry.get("warnings", {}).items()}
+        cutoff = self._warning_cutoff()
+        with self._warning_lock(chat_id):
+            return self._active_warnings(chat_id, cutoff)
+
+    def _op_expire_warnings(self, now: int) -> int:
+        cutoff = self._warning_cutoff(now)
+        if cutoff is None:
+            return 0
+        removed = 0
+        for chat_id, user_id in self._expiry.pop_expired(cutoff):
+            warnings = self._warnings.get(chat_id)
+            times = warnings.get(user_id) if warnings else None
+            if not times:
+                # Reset or removed since it was filed
+                continue
+            removed += drop_expired(times, cutoff)
+            if not times:
+                del warnings[user_id]
+                if not warnings:
+                    del self._warnings[chat_id]
+        return removed
+
+    def expire_warnings(self, now: Optional[int] = None) -> int:
+        if not self._warning_ttl:
+            return 0
+        now = int(time.time()) if now is None else now
+        with self._lock, self._all_chat_locks():
+            # Chats not accessed since loading are not in the wheel yet; index a batch per pass
+            for chat_id in list(islice(self._raw_warnings, _EXPIRY_DECODE_BATCH)):
+                self._chat_warnings(chat_id)
+            removed = self._op_expire_warnings(now)
+            if not removed:
+                return 0
+            generation = self._commit({"op": "expire", "t": now})
+        self._await_durable(generation)
+        logger.info("Expired %s warnings older than %s s", removed, self._warning_ttl)
+        return removed
+
+    def export_json(self, path: str) -> None:
+        """Write the current state as a pretty-printed JSON document to ``path``.
+
+        The file has the layout of the JSON state format and can be used as
+        ``BOT_STORAGE_PATH`` directly.
+        """
+        with self._lock, self._all_chat_locks():
+            payload = self._serialize_json()
+        target = Path(path)
+        tmp_path = target.with_name(target.name + ".tmp")
+        tmp_path.write_text(payload, encoding="utf-8")
+        tmp_path.replace(target)
+
+    def lock_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {"global": lock_stats([self._lock])}
+        if self._chat_locks is not None:
+            stats["chats"] = lock_stats(self._chat_locks.stripes)
+        return stats
 
 
-__all__ = ["ModerationStore"]
+__all__ = ["ModerationStore", "StoreSnapshot", "STATE_FORMATS", "STORAGE_MODES"]
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .keyword_matcher import KeywordMatch, KeywordMatcher
+
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"KWAC"
+# Bump whenever the layout or keyword normalization changes
+FORMAT_VERSION = 3
+# magic, version, byte order, key, then state/transition/output/pattern counts and string blob size
+_HEADER = struct.Struct("<4sIB7x32s5Q")
+_BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+# States whose decoded transitions are kept; the root and shallow states are
+# visited first and stay cached, deep cold ones are decoded on every visit.
+MAX_CACHED_STATES = 4096
+
+
+def automaton_key(keywords: Iterable[str], exceptions: Iterable[str] = ()) -> bytes:
+    """Hash of a keyword set (and exceptions) that a persisted automaton is stamped with."""
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}\x02".encode("ascii"))
+    for keyword in keywords:
+        digest.update(keyword.encode("utf-8"))
+        digest.update(b"\x00")
+    digest.update(b"\x01")
+    for phrase in exceptions:
+        digest.update(phrase.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.digest()
+
+
+def _u32(values: Iterable[int]) -> array:
+    result = array("I", values)
+    if result.itemsize != 4:  # pragma: no cover - exotic platforms
+        result = array("L", result)
+    return result
+
+
+def _payload_size(n_states: int, n_trans: int, n_out: int, n_patterns: int, n_strings: int) -> int:
+    # Header, the uint32 sections in the order FlatAutomaton reads them, then the strings
+    words = (n_states + 1) + 2 * n_trans + n_states + (n_states + 1) + n_out + 3 * n_patterns + 1
+    return _HEADER.size + 4 * words + n_strings
+
+
+def serialize_automaton(matcher: KeywordMatcher, key: bytes) -> bytes:
+    """Lay out the substring automaton of ``matcher`` as one flat buffer.
+
+    Sections (native-endian ``uint32`` arrays, then UTF-8 strings): per-state
+    transition offsets, transition codepoints (sorted per state), transition
+    targets, failure links, per-state output offsets, output pattern ids,
+    pattern lengths, pattern flags (1 = exception), pattern string offsets
+    and the pattern strings themselves.
+    """
+    goto, fail, out, patterns = matcher._goto, matcher._fail, matcher._out, matcher._patterns
+    state_offsets = [0]
+    chars: List[int] = []
+    targets: List[int] = []
+    out_offsets = [0]
+    out_ids: List[int] = []
+    for state in range(len(goto)):
+        for ch, target in sorted(goto[state].items()):
+            chars.append(ord(ch))
+            targets.append(target)
+        state_offsets.append(len(chars))
+        out_ids.extend(out[state])
+        out_offsets.append(len(out_ids))
+    blobs = [keyword.encode("utf-8") for keyword, _, _ in patterns]
+    string_offsets = [0]
+    for blob in blobs:
+        string_offsets.append(string_offsets[-1] + len(blob))
+    strings = b"".join(blobs)
+    header = _HEADER.pack(
+        _MAGIC, FORMAT_VERSION, _BYTE_ORDER, key,
+        len(goto), len(chars), len(out_ids), len(patterns), len(strings),
+    )
+    sections = [
+        _u32(state_offsets), _u32(chars), _u32(targets), _u32(fail),
+        _u32(out_offsets), _u32(out_ids),
+        _u32(length for _, length, _ in patterns), _u32(int(allow) for _, _, allow in patterns),
+        _u32(string_offsets),
+    ]
+    return b"".join([header] + [section.tobytes() for section in sections] + [strings])
+
+
+class _PatternTable(Sequence):
+    """``(keyword, normalized length, is exception)`` per pattern id, decoded on access."""
+
+    def __init__(self, automaton: "FlatAutomaton") -> None:
+        self._automaton = automaton
+
+    def __len__(self) -> int:
+        return self._automaton._n_patterns
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        automaton = self._automaton
+        if index < 0:
+            index += automaton._n_patterns
+        if not 0 <= index < automaton._n_patterns:
+            raise IndexError(index)
+        offsets = automaton._string_offsets
+        keyword = bytes(automaton._strings[offsets[index]:offsets[index + 1]]).decode("utf-8")
+        return keyword, automaton._lengths[index], bool(automaton._flags[index])
+
+
+class FlatAutomaton:
+    """Aho-Corasick automaton read directly from a flat buffer.
+
+    The buffer can be ``bytes``, an ``mmap`` of a file written by
+    :func:`serialize_automaton`; nothing is copied on load, so processes
+    that map the same file share its pages. Transitions of a state are decoded into a small dict the first
+    time the state is visited (``cache_states``), so hot states match at
+    dict speed while cold ones cost nothing. At most ``max_cached_states``
+    states are cached, which bounds the memory a long-lived process spends.
+    """
+
+    def __init__(
+        self,
+        buffer: Buffer,
+        cache_states: bool = True,
+        owner: object = None,
+        max_cached_states: int = MAX_CACHED_STATES,
+    ) -> None:
+        # Checked before any view is taken, so a rejected mmap can still be closed
+        if len(buffer) < _HEADER.size:
+            raise ValueError("Truncated automaton buffer")
+        magic, version, byte_order, key, n_states, n_trans, n_out, n_patterns, n_strings = _HEADER.unpack_from(buffer)
+        if magic != _MAGIC or version != FORMAT_VERSION or byte_order != _BYTE_ORDER:
+            raise ValueError("Incompatible automaton buffer")
+        # Trailing bytes are tolerated here; cache files must be exact (see load_automaton)
+        if len(buffer) < _payload_size(n_states, n_trans, n_out, n_patterns, n_strings):
+            raise ValueError("Truncated automaton buffer")
+        view = memoryview(buffer)
+        self.key = key
+        offset = _HEADER.size
+        sections = []
+        for count in (n_states + 1, n_trans, n_trans, n_states, n_states + 1, n_out, n_patterns, n_patterns, n_patterns + 1):
+            size = count * 4
+            sections.append(view[offset:offset + size].cast("I"))
+            offset += size
+        (
+            self._state_offsets, self._chars, self._targets, self._fail,
+            self._out_offsets, self._out_ids, self._lengths, self._flags, self._string_offsets,
+        ) = sections
+        if (
+            self._state_offsets[n_states] != n_trans
+            or self._out_offsets[n_states] != n_out
+            or self._string_offsets[n_patterns] != n_strings
+        ):
+            for section in sections:
+                section.release()
+            view.release()
+            raise ValueError("Corrupted automaton buffer")
+        self._strings = view[offset:offset + n_strings]
+        self._size = offset + n_strings
+        self._view = view
+        self._n_patterns = n_patterns
+        self.exception_count = sum(self._flags)
+        self._cache: Optional[Dict[int, Dict[int, int]]] = {} if cache_states else None
+        self._max_cached_states = max_cached_states
+        # Keeps the mmap alive while views exist; set
+        # last so the views above are released before the owner is closed.
+        self._owner = owner if owner is not None else buffer
+
+    def __len__(self) -> int:
+        return self._n_patterns
+
+    @property
+    def payload(self) -> memoryview:
+        """The serialized automaton, e.g. to copy it into another buffer."""
+        return self._view[:self._size]
+
+    def patterns(self) -> Sequence[Tuple[str, int, bool]]:
+        """Return ``(keyword, normalized length, is exception)`` per pattern id.
+
+        Entries are decoded from the buffer on access, so a process that maps
+        a large automaton does not keep its own copy of every keyword.
+        """
+        return _PatternTable(self)
+
+    def _transitions(self, state: int) -> Dict[int, int]:
+        cache = self._cache
+        if cache is not None:
+            trans = cache.get(state)
+            if trans is not None:
+                return trans
+        lo, hi = self._state_offsets[state], self._state_offsets[state + 1]
+        trans = dict(zip(self._chars[lo:hi], self._targets[lo:hi]))
+        # Concurrent scans may overshoot the cap by a few entries
+        if cache is not None and len(cache) < self._max_cached_states:
+            cache[state] = trans
+        return trans
+
+    def scan(
+        self,
+        text: str,
+        allowed: List[Tuple[int, int]],
+        patterns: List[Tuple[str, int, bool]],
+    ) -> List[KeywordMatch]:
+        """Same contract as ``KeywordMatcher._scan``; ``patterns`` come from :meth:`patterns`."""
+        fail = self._fail
+        out_offsets = self._out_offsets
+        out_ids = self._out_ids
+        cache = self._cache if self._cache is not None else {}
+        transitions = self._transitions
+        matches: List[KeywordMatch] = []
+        state = 0
+        for idx, ch in enumerate(text):
+            code = ord(ch)
+            while True:
+                trans = cache.get(state)
+                if trans is None:
+                    trans = transitions(state)
+                nxt = trans.get(code)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            lo = out_offsets[state]
+            hi = out_offsets[state + 1]
+            for k in range(lo, hi):
+                keyword, length, allow = patterns[out_ids[k]]
+                if allow:
+                    allowed.append((idx - length + 1, idx + 1))
+                else:
+                    matches.append(KeywordMatch(keyword, idx - length + 1, idx + 1))
+        return matches
+
+
+def save_automaton(path: Path, matcher: KeywordMatcher, key: bytes) -> None:
+    """Write the automaton of ``matcher`` to ``path`` atomically."""
+    payload = serialize_automaton(matcher, key)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as fh:
+        fh.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_automaton(path: Path, key: bytes) -> Optional[FlatAutomaton]:
+    """Map ``path`` read-only and return its automaton if it is stamped with ``key``.
+
+    Any file that is not exactly a well-formed automaton for ``key`` is
+    treated as a stale cache: None is returned and the caller rebuilds it.
+    """
+    try:
+        with path.open("rb") as fh:
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if len(mapped) < _HEADER.size or _HEADER.unpack_from(mapped)[3] != key:
+            mapped.close()
+            return None
+        if len(mapped) != _payload_size(*_HEADER.unpack_from(mapped)[4:]):
+            raise ValueError("Automaton cache size does not match its header")
+        return FlatAutomaton(mapped)
+    except Exception as exc:
+        logger.warning("Ignoring unreadable automaton cache %s: %s", path, exc)
+        try:
+            mapped.close()
+        except BufferError:
+            # A view into the map is still referenced; it is released with the map object
+            pass
+        return None
+
+
+__all__ = [
+    "FORMAT_VERSION",
+    "MAX_CACHED_STATES",
+    "FlatAutomaton",
+    "automaton_key",
+    "load_automaton",
+    "save_automaton",
+    "serialize_automaton",
+]
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("none", "fsync_on_flush", "fsync_per_write")
+
+
+class GroupCommitFlusher:
+    """Background thread that coalesces dirty marks into periodic flushes.
+
+    Writers call :meth:`mark_dirty` (cheap, no I/O) and get back a generation
+    number. The flusher runs ``flush`` at most every ``interval_ms`` after the
+    first pending change, or as soon as ``max_pending`` changes accumulate.
+    Callers that need durability can block in :meth:`wait_flushed`; all
+    writers waiting on the same flush share a single write.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[], None],
+        interval_ms: int,
+        max_pending: int,
+        name: str = "state-flusher",
+    ) -> None:
+        self._flush = flush
+        self._interval = max(interval_ms, 0) / 1000.0
+        self._max_pending = max(max_pending, 1)
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._generation = 0
+        self._flushed_generation = 0
+        self._waiters = 0
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self) -> int:
+        with self._cond:
+            self._pending += 1
+            self._generation += 1
+            if self._pending == 1 or self._pending >= self._max_pending:
+                self._cond.notify_all()
+            return self._generation
+
+    def wait_flushed(self, generation: int, timeout: Optional[float] = None) -> bool:
+        """Block until the flush covering ``generation`` has completed."""
+        with self._cond:
+            self._waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(
+                    lambda: self._flushed_generation >= generation or self._thread is None,
+                    timeout,
+                )
+            finally:
+                self._waiters -= 1
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=10)
+        with self._cond:
+            self._thread = None
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopped)
+                if not self._pending and self._stopped:
+                    return
+                # Coalescing window: let more changes pile up unless the batch
+                # is already full, someone is blocked on durability, or we stop.
+                self._cond.wait_for(
+                    lambda: self._pending >= self._max_pending or self._waiters or self._stopped,
+                    self._interval,
+                )
+                generation = self._generation
+                batch = self._pending
+                self._pending = 0
+            try:
+                self._flush()
+            except Exception:  # pragma: no cover - defensive logging
+                logger.exception("Failed to flush %s pending changes; will retry", batch)
+                with self._cond:
+                    # Keep waiters blocked: their changes are not durable yet.
+                    self._pending += batch
+                    self._cond.wait_for(lambda: self._stopped, max(self._interval, 1.0))
+                    if self._stopped:
+                        return
+                continue
+            with self._cond:
+                self._flushed_generation = generation
+                self._cond.notify_all()
+
+
+__all__ = ["DURABILITY_MODES", "GroupCommitFlusher"]
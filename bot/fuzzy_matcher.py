@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+
+# Tokens longer than this are not looked up: their deletion neighbourhood
+# grows quadratically and real keywords are much shorter.
+_MAX_TOKEN_LENGTH = 32
+
+
+def allowed_distance(length: int, max_distance: int) -> int:
+    """Edit distance tolerated for a word of ``length`` letters.
+
+    Short words get no slack ("сука" is one edit away from "рука", "мука"
+    and "сумка"), medium ones one edit, long ones up to ``max_distance``.
+    """
+    if length <= 4:
+        return 0
+    if length <= 6:
+        return min(1, max_distance)
+    return max_distance
+
+
+def _deletes(term: str, distance: int) -> Set[str]:
+    """All strings obtained from ``term`` by deleting up to ``distance`` characters."""
+    result = {term}
+    frontier = {term}
+    for _ in range(distance):
+        next_frontier = set()
+        for word in frontier:
+            for idx in range(len(word)):
+                next_frontier.add(word[:idx] + word[idx + 1:])
+        next_frontier -= result
+        result |= next_frontier
+        frontier = next_frontier
+    return result
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal-string-alignment distance of ``a`` and ``b``, or ``limit + 1`` if above ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+class FuzzyIndex:
+    """SymSpell-style deletion index for typo-tolerant whole-word matching.
+
+    Every keyword term is stored under all strings reachable by deleting up
+    to its allowed number of characters. A token is looked up by generating
+    its own deletions and probing the index, then candidates are confirmed
+    with a bounded edit distance, so the cost per token depends on the token
+    length only, not on how many keywords are indexed. Candidates must start
+    with the token's first letter: a different first letter far more often
+    means a different word than a typo.
+
+    Instances are immutable. The deletion index is a shared base dict plus
+    a small delta of variants changed since the base was built;
+    :meth:`updated` copies only the delta, so a keyword edit costs the
+    changed terms' neighbourhoods rather than a copy of the whole index.
+    The delta is folded into a fresh base once it grows to a quarter of it.
+    """
+
+    def __init__(
+        self,
+        max_distance: int,
+        terms: Optional[Dict[str, str]] = None,
+        deletes: Optional[Dict[str, Tuple[str, ...]]] = None,
+        delta: Optional[Dict[str, Tuple[str, ...]]] = None,
+    ) -> None:
+        self._max_distance = max_distance
+        # normalized term -> keyword as entered
+        self._terms: Dict[str, str] = terms if terms is not None else {}
+        # deletion variant -> terms it was derived from; shared, never mutated
+        self._deletes: Dict[str, Tuple[str, ...]] = deletes if deletes is not None else {}
+        # variants changed since ``_deletes`` was built; () marks a removed one
+        self._delta: Dict[str, Tuple[str, ...]] = delta if delta is not None else {}
+
+    def _variant_terms(self, variant: str) -> Tuple[str, ...]:
+        terms = self._delta.get(variant)
+        return terms if terms is not None else self._deletes.get(variant, ())
+
+    @classmethod
+    def build(cls, max_distance: int, entries: Mapping[str, str]) -> "FuzzyIndex":
+        return cls(max_distance).updated(entries)
+
+    @property
+    def max_distance(self) -> int:
+        return self._max_distance
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __bool__(self) -> bool:
+        return bool(self._terms)
+
+    def updated(self, entries: Mapping[str, str]) -> "FuzzyIndex":
+        """Return an index over ``entries`` (``term -> keyword``), reusing this one.
+
+        Only terms missing from, or new compared to, this index have their
+        deletion neighbourhoods recomputed, into a copy of the delta; the
+        base deletion dict is shared with this index.
+        """
+        removed = [term for term in self._terms if term not in entries]
+        added = [term for term in entries if term not in self._terms]
+        delta = dict(self._delta)
+        for term in removed:
+            for variant in _deletes(term, allowed_distance(len(term), self._max_distance)):
+                current = delta.get(variant)
+                if current is None:
+                    current = self._deletes.get(variant, ())
+                delta[variant] = tuple(t for t in current if t != term)
+        for term in added:
+            for variant in _deletes(term, allowed_distance(len(term), self._max_distance)):
+                current = delta.get(variant)
+                if current is None:
+                    current = self._deletes.get(variant, ())
+                delta[variant] = current + (term,)
+        terms = dict(entries)
+        deletes = self._deletes
+        if len(delta) * 4 > len(deletes):
+            deletes = dict(deletes)
+            for variant, variant_terms in delta.items():
+                if variant_terms:
+                    deletes[variant] = variant_terms
+                else:
+                    deletes.pop(variant, None)
+            delta = {}
+        return FuzzyIndex(self._max_distance, terms, deletes, delta)
+
+    def lookup(self, token: str) -> Optional[str]:
+        """Return the keyword closest to ``token`` within its allowed distance."""
+        if len(token) > _MAX_TOKEN_LENGTH:
+            return None
+        exact = self._terms.get(token)
+        if exact is not None:
+            return exact
+        limit = allowed_distance(len(token), self._max_distance)
+        if not limit:
+            return None
+        best: Optional[str] = None
+        best_distance = limit + 1
+        variant_terms = self._variant_terms
+        first = token[0]
+        for variant in _deletes(token, limit):
+            for term in variant_terms(variant):
+                if term[0] != first:
+                    continue
+                term_limit = min(limit, allowed_distance(len(term), self._max_distance))
+                distance = edit_distance(token, term, term_limit)
+                if distance <= term_limit and distance < best_distance:
+                    best, best_distance = term, distance
+        return self._terms[best] if best is not None else None
+
+    def find_all(self, tokens: List[Tuple[str, int]]) -> List[Tuple[str, int, int]]:
+        """Return ``(keyword, start, end)`` for every token close to a keyword."""
+        if not self._terms:
+            return []
+        matches: List[Tuple[str, int, int]] = []
+        lookup = self.lookup
+        for token, offset in tokens:
+            keyword = lookup(token)
+            if keyword is not None:
+                matches.append((keyword, offset, offset + len(token)))
+        return matches
+
+
+__all__ = ["FuzzyIndex", "allowed_distance", "edit_distance"]
@@ -0,0 +1,425 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .fuzzy_matcher import FuzzyIndex
+from .regex_matcher import RegexMatcher, pattern_error, wildcard_to_regex
+from .stemming import StemMatcher
+from .text_normalize import normalize_text, tokenize
+from .word_matcher import WordMatcher
+
+
+# Keywords written as "stem:<основа>" match every inflected form of the stem
+# as a whole word instead of as a substring.
+STEM_PREFIX = "stem:"
+# Keywords written as "word:<слово>" match only whole words.
+WORD_PREFIX = "word:"
+# "re:<regex>" and "mask:<шаблон>" (``*``/``?`` wildcards) keywords run on the
+# raw text, since normalization folds the Latin letters and digits in links,
+# phone numbers and wallet addresses.
+REGEX_PREFIX = "re:"
+MASK_PREFIX = "mask:"
+
+# Per-chat matching modes: "word" treats every plain keyword as a whole word.
+MATCH_MODES = ("substring", "word")
+
+
+def _strip_prefix(keyword: str, prefix: str) -> Optional[str]:
+    if keyword[:len(prefix)].casefold() == prefix:
+        return keyword[len(prefix):]
+    return None
+
+
+def keyword_body(keyword: str) -> str:
+    """Return ``keyword`` without its ``stem:``/``word:``/``re:``/``mask:`` prefix."""
+    for prefix in (STEM_PREFIX, WORD_PREFIX, REGEX_PREFIX, MASK_PREFIX):
+        body = _strip_prefix(keyword, prefix)
+        if body is not None:
+            return body
+    return keyword
+
+
+def keyword_error(keyword: str) -> Optional[str]:
+    """Return why ``keyword`` cannot be compiled, or None if it is usable."""
+    body = _strip_prefix(keyword, REGEX_PREFIX)
+    if body is not None:
+        return pattern_error(body)
+    body = _strip_prefix(keyword, MASK_PREFIX)
+    if body is not None:
+        return pattern_error(wildcard_to_regex(body))
+    return None
+
+
+def fuzzy_terms(keywords: Iterable[str]) -> Dict[str, str]:
+    """Map normalized single-word plain keywords to the keyword as entered.
+
+    These are the keywords eligible for typo-tolerant matching; prefixed and
+    multi-word keywords are left to their own matchers.
+    """
+    terms: Dict[str, str] = {}
+    for keyword in keywords:
+        if not keyword or any(
+            _strip_prefix(keyword, prefix) is not None
+            for prefix in (STEM_PREFIX, WORD_PREFIX, REGEX_PREFIX, MASK_PREFIX)
+        ):
+            continue
+        term = normalize_text(keyword)
+        tokens = tokenize(term)
+        if len(tokens) == 1 and tokens[0][0] == term:
+            terms.setdefault(term, keyword)
+    return terms
+
+
+class KeywordMatch(NamedTuple):
+    keyword: str
+    # Offset of the match in the normalized text
+    offset: int
+    # End offset (exclusive) of the match in the normalized text
+    end: int
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over normalized keywords.
+
+    Built once per keyword-set change; matching is a single pass over the text
+    regardless of how many keywords are loaded. Instances are immutable after
+    construction, so a new matcher can be swapped in while readers still hold
+    the previous one. Keywords and texts both go through
+    :func:`~bot.text_normalize.normalize_text`, so obfuscated spellings match.
+    Keywords prefixed with :data:`STEM_PREFIX` or :data:`WORD_PREFIX` go to a
+    :class:`StemMatcher` or :class:`WordMatcher` instead and are checked once
+    per token of the text. :data:`REGEX_PREFIX` and :data:`MASK_PREFIX`
+    keywords are compiled into a :class:`RegexMatcher` and run on the raw text.
+    An optional :class:`FuzzyIndex` adds typo-tolerant matching per token.
+
+    ``automaton`` is a prebuilt :class:`~bot.flat_automaton.FlatAutomaton`
+    for exactly these plain keywords and exceptions (checked by the caller
+    through its key); it replaces building the dict automaton, which is what
+    dominates start-up with very large keyword lists.
+
+    ``exceptions`` are allowlisted phrases compiled into the same automaton
+    with an exception flag: any keyword hit they overlap is dropped, so
+    "попал" can be allowed while "попа" stays blocked without a second scan.
+    """
+
+    def __init__(
+        self,
+        keywords: Iterable[str],
+        exceptions: Iterable[str] = (),
+        fuzzy: Optional[FuzzyIndex] = None,
+        automaton=None,
+    ) -> None:
+        self._flat = automaton
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        # pattern id -> (original keyword, normalized length, is exception)
+        self._patterns: List[Tuple[str, int, bool]] = []
+        self._keyword_count = 0
+        stems: List[Tuple[str, str]] = []
+        words: List[Tuple[str, str]] = []
+        regexes: List[Tuple[str, str]] = []
+        seen = set()
+        for keyword in keywords:
+            if not keyword:
+                continue
+            body = _strip_prefix(keyword, STEM_PREFIX)
+            if body is not None:
+                stems.append((keyword, body))
+                continue
+            body = _strip_prefix(keyword, WORD_PREFIX)
+            if body is not None:
+                words.append((keyword, body))
+                continue
+            body = _strip_prefix(keyword, REGEX_PREFIX)
+            if body is not None:
+                regexes.append((keyword, body))
+                continue
+            body = _strip_prefix(keyword, MASK_PREFIX)
+            if body is not None:
+                regexes.append((keyword, wildcard_to_regex(body)))
+                continue
+            if automaton is not None:
+                continue
+            folded = normalize_text(keyword) if keyword else ""
+            if not folded or folded in seen:
+                continue
+            seen.add(folded)
+            self._insert(folded, len(self._patterns))
+            self._patterns.append((keyword, len(folded), False))
+        self._keyword_count = len(self._patterns)
+        seen.clear()
+        if automaton is not None:
+            self._patterns = automaton.patterns()
+            self._keyword_count = len(self._patterns) - automaton.exception_count
+            exceptions = ()
+        for phrase in exceptions:
+            folded = normalize_text(phrase) if phrase else ""
+            if not folded or folded in seen:
+                continue
+            seen.add(folded)
+            self._insert(folded, len(self._patterns))
+            self._patterns.append((phrase, len(folded), True))
+        if automaton is None:
+            self._link()
+        self._stems = StemMatcher(stems)
+        self._words = WordMatcher(words)
+        self._regexes = RegexMatcher(regexes)
+        self._fuzzy = fuzzy
+        # Substring keywords indexed as whole words, built on first "word" mode use
+        self._plain_words: Optional[WordMatcher] = None
+        # Alternative substring engine picked by matcher_engines.select_engine;
+        # None runs the automaton below
+        self._engine = None
+
+    def _insert(self, folded: str, pattern_id: int) -> None:
+        state = 0
+        for ch in folded:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (pattern_id,)
+
+    def _link(self) -> None:
+        # Breadth-first pass computing failure links; outputs of the failure
+        # target are merged so matching never has to walk the fail chain.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return self._keyword_count + len(self._stems) + len(self._words) + len(self._regexes)
+
+    def __bool__(self) -> bool:
+        return bool(self._keyword_count) or bool(self._stems) or bool(self._words) or bool(self._regexes)
+
+    @property
+    def keywords(self) -> List[str]:
+        plain = [kw for kw, _, allow in self._patterns if not allow]
+        return plain + self._stems.keywords + self._words.keywords + self._regexes.keywords
+
+    @property
+    def fuzzy(self) -> Optional[FuzzyIndex]:
+        return self._fuzzy
+
+    @property
+    def engine_name(self) -> str:
+        return self._engine.name if self._engine is not None else "aho-corasick"
+
+    def use_engine(self, engine) -> None:
+        """Run plain keywords and exceptions through ``engine`` (None: the automaton).
+
+        Engines must report exactly what the automaton would, so swapping one
+        in under concurrent readers changes timings only, never results.
+        """
+        self._engine = engine
+
+    @property
+    def uses_raw_text(self) -> bool:
+        """True when results depend on the raw text, not only its normalized form."""
+        return bool(self._regexes)
+
+    @property
+    def exceptions(self) -> List[str]:
+        return [phrase for phrase, _, allow in self._patterns if allow]
+
+    def _token_matchers(self, mode: str) -> List[object]:
+        matchers: List[object] = [m for m in (self._stems, self._words, self._fuzzy) if m]
+        if mode == "word" and self._keyword_count:
+            plain = self._plain_words
+            if plain is None:
+                # Benign race: concurrent readers may both build it, the result is identical
+                plain = self._plain_words = WordMatcher(
+                    (kw, kw) for kw, _, allow in self._patterns if not allow
+                )
+            matchers.append(plain)
+        return matchers
+
+    def find_all(
+        self,
+        text: str,
+        overlay: Optional["KeywordMatcher"] = None,
+        normalized: bool = False,
+        mode: str = "substring",
+        raw: Optional[str] = None,
+    ) -> List[KeywordMatch]:
+        """Return every keyword occurrence in ``text``.
+
+        Substring matches come first, ordered by end position, followed by
+        token-based (stem and whole-word) matches in token order. ``overlay``
+        is an optional second automaton (per-chat keywords) that is advanced
+        in the same pass over the text, so layering chat keywords on top of
+        the global list never costs a second scan. In ``mode="word"`` plain
+        keywords only match whole words: the text is tokenized once and each
+        token is a hash lookup, and the automaton only runs when there are
+        exception phrases to find. Hits overlapping an exception are
+        dropped. Pass
+        ``normalized=True`` when ``text`` already went through
+        :func:`normalize_text`, together with the original text as ``raw``
+        for regex keywords. Regex hits are reported with offsets into the raw
+        text and are not subject to exceptions.
+        """
+        if not text and not raw:
+            return []
+        if not normalized:
+            raw = text
+            text = normalize_text(text)
+        elif raw is None:
+            raw = text
+        if overlay is not None and not overlay._patterns and not overlay:
+            overlay = None
+        allowed: List[Tuple[int, int]] = []
+        if mode != "word":
+            matches = self._scan_substrings(text, overlay, allowed)
+        elif len(self._patterns) > self._keyword_count or (
+            overlay is not None and len(overlay._patterns) > overlay._keyword_count
+        ):
+            # Whole-word mode only needs the automaton for exception spans
+            self._scan_substrings(text, overlay, allowed)
+            matches = []
+        else:
+            matches = []
+        token_matchers = self._token_matchers(mode)
+        if overlay is not None:
+            token_matchers.extend(overlay._token_matchers(mode))
+        if token_matchers:
+            tokens = tokenize(text)
+            for matcher in token_matchers:
+                matches.extend(KeywordMatch(*match) for match in matcher.find_all(tokens))
+        if allowed and matches:
+            matches = [
+                match for match in matches
+                if not any(start < match.end and match.offset < end for start, end in allowed)
+            ]
+        for matcher in (self, overlay):
+            if matcher is not None and matcher._regexes:
+                matches.extend(KeywordMatch(*match) for match in matcher._regexes.find_all(raw))
+        return matches
+
+    def _scan_substrings(
+        self,
+        text: str,
+        overlay: Optional["KeywordMatcher"],
+        allowed: List[Tuple[int, int]],
+    ) -> List[KeywordMatch]:
+        # Exception spans are collected into ``allowed``; keyword hits are returned
+        engine = self._engine
+        if engine is not None or self._flat is not None:
+            matches = engine.scan(text, allowed) if engine is not None else self._scan(text, allowed)
+            if overlay is not None and overlay._patterns:
+                matches.extend(overlay._scan(text, allowed))
+            return matches
+        if overlay is None or not overlay._patterns:
+            return self._scan(text, allowed) if self._patterns else []
+        if not self._patterns:
+            return overlay._scan(text, allowed)
+        g_goto, g_fail, g_out, g_patterns = self._goto, self._fail, self._out, self._patterns
+        o_goto, o_fail, o_out, o_patterns = overlay._goto, overlay._fail, overlay._out, overlay._patterns
+        matches: List[KeywordMatch] = []
+        g_state = 0
+        o_state = 0
+        for idx, ch in enumerate(text):
+            while True:
+                nxt = g_goto[g_state].get(ch)
+                if nxt is not None:
+                    g_state = nxt
+                    break
+                if not g_state:
+                    break
+                g_state = g_fail[g_state]
+            while True:
+                nxt = o_goto[o_state].get(ch)
+                if nxt is not None:
+                    o_state = nxt
+                    break
+                if not o_state:
+                    break
+                o_state = o_fail[o_state]
+            if g_out[g_state]:
+                for pattern_id in g_out[g_state]:
+                    keyword, length, allow = g_patterns[pattern_id]
+                    if allow:
+                        allowed.append((idx - length + 1, idx + 1))
+                    else:
+                        matches.append(KeywordMatch(keyword, idx - length + 1, idx + 1))
+            if o_out[o_state]:
+                for pattern_id in o_out[o_state]:
+                    keyword, length, allow = o_patterns[pattern_id]
+                    if allow:
+                        allowed.append((idx - length + 1, idx + 1))
+                    else:
+                        matches.append(KeywordMatch(keyword, idx - length + 1, idx + 1))
+        return matches
+
+    def _scan(self, normalized: str, allowed: List[Tuple[int, int]]) -> List[KeywordMatch]:
+        if self._flat is not None:
+            return self._flat.scan(normalized, allowed, self._patterns)
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        patterns = self._patterns
+        matches: List[KeywordMatch] = []
+        state = 0
+        for idx, ch in enumerate(normalized):
+            while True:
+                nxt = goto[state].get(ch)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if out[state]:
+                for pattern_id in out[state]:
+                    keyword, length, allow = patterns[pattern_id]
+                    if allow:
+                        allowed.append((idx - length + 1, idx + 1))
+                    else:
+                        matches.append(KeywordMatch(keyword, idx - length + 1, idx + 1))
+        return matches
+
+    def matched_keywords(
+        self,
+        text: str,
+        overlay: Optional["KeywordMatcher"] = None,
+        normalized: bool = False,
+        mode: str = "substring",
+        raw: Optional[str] = None,
+    ) -> List[str]:
+        """Return distinct matched keywords in order of first occurrence."""
+        result: List[str] = []
+        seen = set()
+        for match in sorted(self.find_all(text, overlay, normalized, mode, raw), key=lambda m: m.offset):
+            folded = match.keyword.casefold()
+            if folded not in seen:
+                seen.add(folded)
+                result.append(match.keyword)
+        return result
+
+
+__all__ = [
+    "MASK_PREFIX",
+    "MATCH_MODES",
+    "REGEX_PREFIX",
+    "STEM_PREFIX",
+    "WORD_PREFIX",
+    "KeywordMatch",
+    "KeywordMatcher",
+    "keyword_body",
+    "keyword_error",
+]
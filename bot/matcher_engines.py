@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import logging
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+from .keyword_matcher import KeywordMatch, KeywordMatcher
+from .text_normalize import normalize_text, tokenize
+from .word_matcher import WordMatcher
+
+
+logger = logging.getLogger(__name__)
+
+# (normalized text, keyword as entered, is exception)
+Pattern = Tuple[str, str, bool]
+Span = Tuple[int, int]
+
+
+class MatcherEngine(ABC):
+    """Substring stage of :class:`~bot.keyword_matcher.KeywordMatcher`.
+
+    An engine finds the plain (unprefixed) keywords and the exception phrases
+    in normalized text. Keyword hits are returned, exception spans are
+    appended to ``allowed``. Stem, whole-word and regex keywords are not
+    affected by the engine choice.
+    """
+
+    name = ""
+    # Engines that get too slow to build above this many patterns are skipped
+    max_patterns: Optional[int] = None
+    # False for engines that report non-overlapping hits only; they are
+    # skipped whenever two pattern occurrences could overlap
+    overlapping = True
+
+    def __init__(self, patterns: Sequence[Pattern]) -> None:
+        self._patterns = list(patterns)
+
+    @abstractmethod
+    def scan(self, text: str, allowed: List[Span]) -> List[KeywordMatch]:
+        """Return keyword hits in normalized ``text``; collect exception spans."""
+
+
+class AhoCorasickEngine(MatcherEngine):
+    """The matcher's own automaton; the reference every other engine is checked against."""
+
+    name = "aho-corasick"
+
+    def __init__(self, patterns: Sequence[Pattern], matcher: KeywordMatcher) -> None:
+        super().__init__(patterns)
+        self._matcher = matcher
+
+    def scan(self, text: str, allowed: List[Span]) -> List[KeywordMatch]:
+        return self._matcher._scan(text, allowed) if self._matcher._patterns else []
+
+
+class NaiveEngine(MatcherEngine):
+    """One ``str.find`` loop per pattern; cheapest for a handful of keywords."""
+
+    name = "naive"
+    max_patterns = 5000
+
+    def scan(self, text: str, allowed: List[Span]) -> List[KeywordMatch]:
+        matches: List[KeywordMatch] = []
+        for folded, keyword, allow in self._patterns:
+            idx = text.find(folded)
+            while idx != -1:
+                if allow:
+                    allowed.append((idx, idx + len(folded)))
+                else:
+                    matches.append(KeywordMatch(keyword, idx, idx + len(folded)))
+                idx = text.find(folded, idx + 1)
+        return matches
+
+
+class RegexEngine(MatcherEngine):
+    """All patterns in one ``re`` alternation, longest first.
+
+    The scan runs in C but reports non-overlapping hits only, so it is built
+    only for pattern sets whose occurrences can never overlap.
+    """
+
+    name = "regex"
+    max_patterns = 2000
+    overlapping = False
+
+    def __init__(self, patterns: Sequence[Pattern]) -> None:
+        super().__init__(patterns)
+        ordered = sorted(set(folded for folded, _, _ in self._patterns), key=len, reverse=True)
+        self._lookup: Dict[str, List[Tuple[str, bool]]] = {}
+        for folded, keyword, allow in self._patterns:
+            self._lookup.setdefault(folded, []).append((keyword, allow))
+        self._regex = re.compile("|".join(re.escape(folded) for folded in ordered)) if ordered else None
+
+    def scan(self, text: str, allowed: List[Span]) -> List[KeywordMatch]:
+        if self._regex is None:
+            return []
+        matches: List[KeywordMatch] = []
+        for match in self._regex.finditer(text):
+            for keyword, allow in self._lookup[match.group()]:
+                if allow:
+                    allowed.append(match.span())
+                else:
+                    matches.append(KeywordMatch(keyword, match.start(), match.end()))
+        return matches
+
+
+class TokenSetEngine(MatcherEngine):
+    """Hash lookup per token; equivalent only when keywords occur as whole words."""
+
+    name = "token-set"
+
+    def __init__(self, patterns: Sequence[Pattern]) -> None:
+        super().__init__(patterns)
+        self._keywords = WordMatcher((keyword, folded) for folded, keyword, allow in self._patterns if not allow)
+        self._exceptions = WordMatcher((keyword, folded) for folded, keyword, allow in self._patterns if allow)
+
+    def scan(self, text: str, allowed: List[Span]) -> List[KeywordMatch]:
+        tokens = tokenize(text)
+        allowed.extend((start, end) for _, start, end in self._exceptions.find_all(tokens))
+        return [KeywordMatch(*match) for match in self._keywords.find_all(tokens)]
+
+
+ENGINES: Dict[str, Type[MatcherEngine]] = {
+    AhoCorasickEngine.name: AhoCorasickEngine,
+    NaiveEngine.name: NaiveEngine,
+    RegexEngine.name: RegexEngine,
+    TokenSetEngine.name: TokenSetEngine,
+}
+
+
+def patterns_can_overlap(matcher: KeywordMatcher) -> bool:
+    """True when two occurrences of the matcher's substring patterns can overlap.
+
+    Read off the automaton: occurrences are always disjoint exactly when
+    every state that ends a pattern is a leaf (no pattern is a prefix or,
+    through merged outputs, an infix of another) and fails to the root (no
+    proper suffix of a pattern starts another one, itself included).
+    """
+    flat = matcher._flat
+    if flat is not None:
+        out_offsets, state_offsets, fail = flat._out_offsets, flat._state_offsets, flat._fail
+        return any(
+            out_offsets[state] != out_offsets[state + 1]
+            and (fail[state] or state_offsets[state] != state_offsets[state + 1])
+            for state in range(len(fail))
+        )
+    return any(
+        out and (fail or goto)
+        for out, fail, goto in zip(matcher._out, matcher._fail, matcher._goto)
+    )
+
+
+def _skip_reason(name: str, matcher: KeywordMatcher) -> Optional[str]:
+    engine_cls = ENGINES[name]
+    if engine_cls.max_patterns is not None and len(matcher._patterns) > engine_cls.max_patterns:
+        return "too many keywords"
+    if not engine_cls.overlapping and patterns_can_overlap(matcher):
+        return "overlapping keywords"
+    return None
+
+
+def build_engine(name: str, matcher: KeywordMatcher) -> Optional[MatcherEngine]:
+    """Build engine ``name`` over the substring patterns of ``matcher``.
+
+    Returns None when the engine does not support that many patterns, or
+    reports non-overlapping hits only and the patterns can overlap.
+    """
+    patterns = [(normalize_text(keyword), keyword, allow) for keyword, _, allow in matcher._patterns]
+    if name == AhoCorasickEngine.name:
+        return AhoCorasickEngine(patterns, matcher)
+    if _skip_reason(name, matcher) is not None:
+        return None
+    return ENGINES[name](patterns)
+
+
+def _probes(matcher: KeywordMatcher, limit: int = 200) -> List[str]:
+    # Keywords glued into other words and next to each other: exposes engines
+    # that only see whole tokens or miss overlapping hits, even when recent
+    # traffic happens not to contain such texts.
+    probes = []
+    for keyword, _, _ in matcher._patterns[:limit]:
+        folded = normalize_text(keyword)
+        probes.append(folded)
+        probes.append(f"ж{folded}ж {folded}{folded}")
+    return probes
+
+
+def _run(engine: MatcherEngine, samples: Sequence[str]) -> List[Tuple[List[KeywordMatch], List[Span]]]:
+    results = []
+    for text in samples:
+        allowed: List[Span] = []
+        matches = engine.scan(text, allowed)
+        results.append((sorted(matches), sorted(allowed)))
+    return results
+
+
+def select_engine(
+    matcher: KeywordMatcher,
+    samples: Sequence[str],
+    candidates: Sequence[str] = tuple(ENGINES),
+    rounds: int = 3,
+) -> Tuple[str, Dict[str, str]]:
+    """Micro-benchmark engines on normalized ``samples`` and install the fastest.
+
+    Every candidate must produce exactly the automaton's keyword hits and
+    exception spans on all samples to qualify; the fastest qualifying engine
+    (best of ``rounds``) is installed with :meth:`KeywordMatcher.use_engine`.
+    Returns the chosen name and a per-engine timing/status report.
+    """
+    report: Dict[str, str] = {}
+    reference_engine = build_engine(AhoCorasickEngine.name, matcher)
+    checks = list(samples) + _probes(matcher)
+    reference = _run(reference_engine, checks)
+    best_name = AhoCorasickEngine.name
+    best_time: Optional[float] = None
+    built: Dict[str, MatcherEngine] = {}
+    for name in candidates:
+        if name not in ENGINES:
+            report[name] = "unknown"
+            continue
+        skip = None if name == AhoCorasickEngine.name else _skip_reason(name, matcher)
+        if skip is not None:
+            report[name] = f"skipped ({skip})"
+            continue
+        started = time.perf_counter()
+        engine = reference_engine if name == AhoCorasickEngine.name else build_engine(name, matcher)
+        build_ms = (time.perf_counter() - started) * 1000.0
+        if name != AhoCorasickEngine.name and _run(engine, checks) != reference:
+            report[name] = f"build {build_ms:.1f} ms, results differ"
+            continue
+        elapsed = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for text in samples:
+                engine.scan(text, [])
+            took = time.perf_counter() - started
+            elapsed = took if elapsed is None else min(elapsed, took)
+        per_message_us = elapsed / len(samples) * 1e6 if samples else 0.0
+        report[name] = f"build {build_ms:.1f} ms, {per_message_us:.1f} us/msg"
+        built[name] = engine
+        if best_time is None or elapsed < best_time:
+            best_name, best_time = name, elapsed
+    matcher.use_engine(None if best_name == AhoCorasickEngine.name else built[best_name])
+    logger.info(
+        "Keyword engine for %s keywords on %s samples: %s (%s)",
+        len(matcher._patterns),
+        len(samples),
+        best_name,
+        "; ".join(f"{name}: {status}" for name, status in report.items()),
+    )
+    return best_name, report
+
+
+__all__ = [
+    "ENGINES",
+    "AhoCorasickEngine",
+    "MatcherEngine",
+    "NaiveEngine",
+    "RegexEngine",
+    "TokenSetEngine",
+    "build_engine",
+    "patterns_can_overlap",
+    "select_engine",
+]
@@ -5,21 +5,36 @@ import shlex
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Deque
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Deque
 from collections import deque, defaultdict
 
+from .categories import KEYWORD_ACTIONS
 from .config import BotConfig
-from .data_store import ModerationStore
+from .keyword_matcher import MATCH_MODES, REGEX_PREFIX, KeywordMatcher, keyword_body, keyword_error
+from .matcher_engines import build_engine, select_engine
+from .near_duplicate import NearDuplicateIndex
+from .store_base import BaseModerationStore, StoreSnapshot
 from .telegram_api import TelegramAPI, TelegramAPIError
+from .text_normalize import normalize_text
+from .verdict_cache import VerdictCache
 
 
 logger = logging.getLogger(__name__)
 
 
+class ModerationVerdict(NamedTuple):
+    # "flood", "long", "keywords" or "duplicate"
+    action: str
+    matched_keywords: Tuple[str, ...] = ()
+    # For keyword hits: category of the harshest keyword and its action
+    category: Optional[str] = None
+    penalty: str = "warn"
+
+
 class ModerationBot:
     """Implements the moderation workflow and admin commands."""
 
-    def __init__(self, config: BotConfig, store: ModerationStore, api: TelegramAPI) -> None:
+    def __init__(self, config: BotConfig, store: BaseModerationStore, api: TelegramAPI) -> None:
         self.config = config
         self.store = store
         self.api = api
@@ -43,6 +58,23 @@ class ModerationBot:
         # chat_id -> user_id -> deque[timestamps]
         self._rate_buckets: Dict[int, Dict[int, Deque[float]]] = defaultdict(lambda: defaultdict(deque))
         self._rate_lock = threading.RLock()
+        # Memoized keyword verdicts for texts pasted over and over
+        self._verdict_cache = VerdictCache(getattr(config, "verdict_cache_size", 4096))
+        # Cross-chat near-duplicate detection (same ad posted to every chat)
+        self._duplicates = NearDuplicateIndex(
+            chat_threshold=getattr(config, "dup_chat_threshold", 0),
+            window_seconds=getattr(config, "dup_window_seconds", 60),
+            max_entries=getattr(config, "dup_max_entries", 10000),
+            min_words=getattr(config, "dup_min_words", 5),
+        )
+        # Substring engine for the global matcher: "auto" benchmarks them per keyword set
+        self._matcher_engine = getattr(config, "matcher_engine", "auto")
+        # Recent normalized texts used as the benchmark sample
+        self._traffic_samples: Deque[str] = deque(maxlen=256)
+        self._engine_keyword_version: Optional[int] = None
+        # Expired warnings are swept from the main thread's idle loop
+        self._expiry_interval = 60.0
+        self._next_expiry = 0.0
 
         # Button labels (RU)
         self.BTN_MENU = "Меню"
@@ -70,6 +102,7 @@ class ModerationBot:
 
     def start(self) -> None:
         logger.info("Starting moderation bot")
+        self._maybe_select_engine(self.store.snapshot())
         self._polling_thread.start()
 
     def run_forever(self) -> None:
@@ -77,10 +110,20 @@ class ModerationBot:
         try:
             while not self._stop_event.is_set():
                 time.sleep(0.5)
+                self._maybe_expire_warnings(time.monotonic())
         except KeyboardInterrupt:
             logger.info("Keyboard interrupt received. Stopping bot...")
             self.stop()
 
+    def _maybe_expire_warnings(self, now: float) -> None:
+        if now < self._next_expiry:
+            return
+        self._next_expiry = now + self._expiry_interval
+        try:
+            self.store.expire_warnings()
+        except Exception:  # pragma: no cover - defensive logging
+            logger.exception("Failed to expire warnings")
+
     def stop(self) -> None:
         self._stop_event.set()
         self._executor.shutdown(wait=True, cancel_futures=True)
@@ -105,9 +148,74 @@ class ModerationBot:
             if not updates:
                 continue
 
-            for update in updates:
-                self._offset = update.get("update_id", 0) + 1
+            self._offset = updates[-1].get("update_id", 0) + 1
+            try:
+                self._dispatch_batch(updates)
+            except Exception:  # pragma: no cover - defensive logging
+                logger.exception("Failed to dispatch a batch of %s updates", len(updates))
+
+    def _dispatch_batch(self, updates: List[Dict[str, Any]]) -> None:
+        """Classify a whole getUpdates batch, then fan the actions out to workers.
+
+        Moderated group messages are grouped by chat and checked against one
+        store snapshot, so the chat lookup and flood-lock acquisition happen
+        once per chat instead of once per update. Callbacks and admin messages
+        go to the worker pool unchanged.
+        """
+        by_chat: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for update in updates:
+            message = self._extract_message(update)
+            if update.get("callback_query") or not message or self._is_admin_context(message):
                 self._executor.submit(self._handle_update, update)
+                continue
+            by_chat[message.get("chat", {}).get("id")].append(message)
+        if not by_chat:
+            return
+        snapshot = self.store.snapshot()
+        self._maybe_select_engine(snapshot)
+        now = time.time()
+        for chat_id, messages in by_chat.items():
+            actions = self._classify_chat_messages(chat_id, messages, snapshot, now)
+            if actions:
+                self._executor.submit(self._apply_verdicts, actions)
+
+    def _maybe_select_engine(self, snapshot: StoreSnapshot) -> None:
+        """Pick the substring engine once per keyword-set version, off the polling thread."""
+        if snapshot.keyword_version == self._engine_keyword_version:
+            return
+        self._engine_keyword_version = snapshot.keyword_version
+        self._executor.submit(self._select_engine, snapshot.matcher)
+
+    def _select_engine(self, matcher: KeywordMatcher) -> None:
+        try:
+            if self._matcher_engine != "auto":
+                engine = build_engine(self._matcher_engine, matcher)
+                if engine is None:
+                    logger.warning(
+                        "Engine %s cannot run these %s keywords (too many or overlapping), keeping aho-corasick",
+                        self._matcher_engine,
+                        len(matcher),
+                    )
+                elif self._matcher_engine != "aho-corasick":
+                    matcher.use_engine(engine)
+                return
+            samples = list(self._traffic_samples)
+            if not samples:
+                # Nothing seen yet (startup): benchmark on the keywords themselves
+                keywords = matcher.keywords[:500]
+                samples = [normalize_text(" ".join(keywords[i:i + 5])) for i in range(0, len(keywords), 5)]
+            if samples:
+                select_engine(matcher, samples)
+        except Exception:  # pragma: no cover - selection must never break moderation
+            logger.exception("Keyword engine selection failed")
+
+    def _extract_message(self, update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return (
+            update.get("message")
+            or update.get("edited_message")
+            or update.get("channel_post")
+            or update.get("edited_channel_post")
+        )
 
     def _handle_update(self, update: Dict[str, Any]) -> None:
         # Handle callback queries first (inline keyboard)
@@ -116,12 +224,7 @@ class ModerationBot:
             self._handle_callback(callback)
             return
 
-        message: Optional[Dict[str, Any]] = (
-            update.get("message")
-            or update.get("edited_message")
-            or update.get("channel_post")
-            or update.get("edited_channel_post")
-        )
+        message = self._extract_message(update)
         if not message:
             return
 
@@ -270,6 +373,7 @@ class ModerationBot:
                     words = self._parse_words_csv(text)
                     if not words:
                         raise ValueError("Нужно отправить слова через запятую")
+                    self._check_keywords(words)
                     added = self.store.add_keywords(words)
                     if added:
                         self._send_to_chat(chat_id, f"Добавлено слов: {added}.", reply_markup=self._reply_keyboard("words"))
@@ -329,9 +433,20 @@ class ModerationBot:
             "/list_chats": self._cmd_list_chats,
             "/add_keyword": self._cmd_add_keyword,
             "/remove_keyword": self._cmd_remove_keyword,
+            "/add_exception": self._cmd_add_exception,
+            "/remove_exception": self._cmd_remove_exception,
+            "/list_exceptions": self._cmd_list_exceptions,
             "/list_keywords": self._cmd_list_keywords,
+            "/add_chat_keyword": self._cmd_add_chat_keyword,
+            "/remove_chat_keyword": self._cmd_remove_chat_keyword,
+            "/set_match_mode": self._cmd_set_match_mode,
+            "/set_category": self._cmd_set_category,
+            "/remove_category": self._cmd_remove_category,
+            "/add_category_keyword": self._cmd_add_category_keyword,
+            "/list_categories": self._cmd_list_categories,
             "/warnings": self._cmd_warnings,
             "/reset_warning": self._cmd_reset_warning,
+            "/stats": self._cmd_stats,
         }
         handler = handlers.get(command)
         if not handler:
@@ -346,70 +461,139 @@ class ModerationBot:
             self._send_to_chat(chat_id, "Произошла внутренняя ошибка при обработке команды.", reply_markup=self._main_keyboard())
 
     def _handle_moderation(self, message: Dict[str, Any]) -> None:
-        chat = message.get("chat", {})
-        chat_id = chat.get("id")
-        chat_type = chat.get("type")
-        if chat_id in self.config.admin_chat_ids:
-            return
-        if not self.store.is_chat_moderated(chat_id):
-            return
-        # Only in group contexts
-        if chat_type not in ("group", "supergroup"):
-            return
+        chat_id = message.get("chat", {}).get("id")
+        actions = self._classify_chat_messages(chat_id, [message], self.store.snapshot(), time.time())
+        self._apply_verdicts(actions)
+
+    def _classify_chat_messages(
+        self,
+        chat_id: Optional[int],
+        messages: List[Dict[str, Any]],
+        snapshot: StoreSnapshot,
+        now: float,
+    ) -> List[Tuple[Dict[str, Any], ModerationVerdict]]:
+        """Run flood, length and keyword checks for messages from one chat.
+
+        Returns the messages that need an action, in arrival order. Only the
+        anti-flood buckets are mutated; no Telegram calls are made here.
+        """
+        if chat_id is None or chat_id in self.config.admin_chat_ids:
+            return []
+        if chat_id not in snapshot.moderated_chat_ids:
+            return []
+
+        candidates: List[Tuple[Dict[str, Any], int]] = []
+        for message in messages:
+            # Only in group contexts
+            if message.get("chat", {}).get("type") not in ("group", "supergroup"):
+                continue
+            user_id = message.get("from", {}).get("id")
+            if user_id is None or message.get("message_id") is None:
+                continue
+            candidates.append((message, user_id))
+        if not candidates:
+            return []
 
         # Anti-flood: enforce per-user message rate in a sliding window
-        user = message.get("from", {})
-        user_id = user.get("id")
-        message_id = message.get("message_id")
-        if user_id is None or message_id is None:
-            return
-        now = time.time()
-        exceeded = False
+        flooded: List[bool] = []
         with self._rate_lock:
-            dq = self._rate_buckets[chat_id][user_id]
-            while dq and now - dq[0] > self.RL_WINDOW_SECONDS:
-                dq.popleft()
-            # Do not append a new timestamp if already at/over the limit within the window.
-            # This prevents extending the cooldown indefinitely for active users.
-            if len(dq) >= self.RL_MAX_MESSAGES and (dq and now - dq[0] <= self.RL_WINDOW_SECONDS):
-                exceeded = True
-            else:
-                dq.append(now)
-        if exceeded:
+            chat_buckets = self._rate_buckets[chat_id]
+            for _, user_id in candidates:
+                dq = chat_buckets[user_id]
+                while dq and now - dq[0] > self.RL_WINDOW_SECONDS:
+                    dq.popleft()
+                # Do not append a new timestamp if already at/over the limit within the window.
+                # This prevents extending the cooldown indefinitely for active users.
+                if len(dq) >= self.RL_MAX_MESSAGES and (dq and now - dq[0] <= self.RL_WINDOW_SECONDS):
+                    flooded.append(True)
+                else:
+                    dq.append(now)
+                    flooded.append(False)
+
+        # Chats without their own keywords have no overlay and share the global matcher
+        has_keywords = bool(snapshot.matcher) or chat_id in snapshot.chat_matchers
+        actions: List[Tuple[Dict[str, Any], ModerationVerdict]] = []
+        for (message, _), exceeded in zip(candidates, flooded):
+            if exceeded:
+                actions.append((message, ModerationVerdict("flood")))
+                continue
+            text = self._extract_text(message)
+            if not text:
+                continue
+            # Detect overly long messages
+            if len(text) > self.MAX_MESSAGE_LENGTH:
+                actions.append((message, ModerationVerdict("long")))
+                continue
+            # Detect forbidden keywords (when configured) in a single automaton pass
+            matched = self._match_keywords(text, snapshot, chat_id) if has_keywords else ()
+            # Every text feeds the near-duplicate index, even keyword hits,
+            # so clusters are learned from the first copy onwards.
+            duplicate = self._duplicates.observe(chat_id, text, now)
+            if matched:
+                category, penalty = snapshot.keyword_action(matched)
+                actions.append((message, ModerationVerdict("keywords", matched, category, penalty)))
+            elif duplicate:
+                actions.append((message, ModerationVerdict("duplicate")))
+        return actions
+
+    def _match_keywords(self, text: str, snapshot: StoreSnapshot, chat_id: int) -> Tuple[str, ...]:
+        overlay = snapshot.chat_matchers.get(chat_id)
+        mode = snapshot.chat_match_mode(chat_id)
+        # Normalize once: obfuscated variants of the same spam share a cache entry
+        normalized = normalize_text(text)
+        self._traffic_samples.append(normalized)
+        # Verdicts for chats with an overlay or their own match mode depend on the chat, not only the text
+        chat_specific = overlay is not None or mode != "substring"
+        # Regex keywords see the raw text, so only identical texts may share a verdict
+        cache_text = text if snapshot.matcher.uses_raw_text or (overlay is not None and overlay.uses_raw_text) else normalized
+        key = self._verdict_cache.key_for(f"{chat_id}\x00{cache_text}" if chat_specific else cache_text)
+        matched = self._verdict_cache.get(snapshot.keyword_version, key)
+        if matched is None:
+            matched = tuple(
+                snapshot.matcher.matched_keywords(normalized, overlay, normalized=True, mode=mode, raw=text)
+            )
+            self._verdict_cache.put(snapshot.keyword_version, key, matched)
+        return matched
+
+    def _apply_verdicts(self, actions: List[Tuple[Dict[str, Any], ModerationVerdict]]) -> None:
+        for message, verdict in actions:
+            try:
+                self._apply_verdict(message, verdict)
+            except Exception:  # pragma: no cover - defensive logging
+                logger.exception("Failed to apply %s verdict", verdict.action)
+
+    def _apply_verdict(self, message: Dict[str, Any], verdict: ModerationVerdict) -> None:
+        chat_id = message.get("chat", {}).get("id")
+        message_id = message.get("message_id")
+        if verdict.action == "flood":
             try:
                 self.api.delete_message(chat_id, message_id)
             except TelegramAPIError as exc:
                 logger.warning("Failed to delete flood message %s in chat %s: %s", message_id, chat_id, exc)
                 return
             self._send_ephemeral(chat_id, "Не флуди!")
-            return
-
-        text = self._extract_text(message)
-        if not text:
-            return
-
-        # Detect overly long messages
-        is_long = len(text) > self.MAX_MESSAGE_LENGTH
-        if is_long:
+        elif verdict.action == "long":
             # For long messages: just delete without warnings/ban and notify with mention
             try:
-                self.api.delete_message(chat_id, message.get("message_id"))
+                self.api.delete_message(chat_id, message_id)
             except TelegramAPIError as exc:
-                logger.warning("Failed to delete long message %s in chat %s: %s", message.get("message_id"), chat_id, exc)
+                logger.warning("Failed to delete long message %s in chat %s: %s", message_id, chat_id, exc)
                 return
             mention_text, parse_mode = self._build_mention(message.get("from", {}))
             self._send_ephemeral(chat_id, f"{mention_text}, сообщение слишком длинное. Сократите, пожалуйста.", parse_mode=parse_mode)
-            return
-
-        # Detect forbidden keywords (when configured)
-        matched: List[str] = []
-        keywords = self.store.get_keywords(chat_id)
-        if keywords:
-            text_cf = text.casefold()
-            matched = [kw for kw in keywords if kw.casefold() in text_cf]
-
-        if matched:
-            self._process_violation(message, matched)
+        elif verdict.action == "keywords":
+            if verdict.penalty == "warn":
+                self._process_violation(message, list(verdict.matched_keywords))
+            else:
+                self._apply_category_action(message, verdict)
+        elif verdict.action == "duplicate":
+            # Cross-chat spam copies are removed silently: no warning, no notice.
+            try:
+                self.api.delete_message(chat_id, message_id)
+            except TelegramAPIError as exc:
+                logger.warning("Failed to delete duplicate message %s in chat %s: %s", message_id, chat_id, exc)
+                return
+            logger.info("Deleted cross-chat duplicate %s in chat %s", message_id, chat_id)
 
     def _process_violation(self, message: Dict[str, Any], matched_keywords: List[str]) -> None:
         chat = message.get("chat", {})
@@ -431,8 +615,8 @@ class ModerationBot:
 
         warning_count = self.store.increment_warning(chat_id, user_id)
         limit = self.config.warning_limit
-        detected = matched_keywords[0] if matched_keywords else "запрещенное слово"
-        detected_safe = self._escape_html(detected)
+        detected = keyword_body(matched_keywords[0]) if matched_keywords else "запрещенное слово"
+        detected_safe = self._escape_html(detected) if parse_mode == "HTML" else detected
         warning_text = (
             f"{mention_text}, вам вынесено предупреждение за нарушение: «{detected_safe}». "
             f"Пожалуйста, соблюдайте правила чата. Предупреждение {warning_count} из {limit}."
@@ -443,7 +627,76 @@ class ModerationBot:
         if warning_count >= limit:
             self._enforce_ban(chat_id, user_id, user_display, warning_count)
 
-    def _enforce_ban(self, chat_id: int, user_id: int, user_display: str, warning_count: int) -> None:
+    def _apply_category_action(self, message: Dict[str, Any], verdict: ModerationVerdict) -> None:
+        """Handle keyword hits whose category is set to delete, mute or ban.
+
+        Unlike :meth:`_process_violation` no warning is recorded: "delete"
+        costs a single API call, "mute" and "ban" act on the user right away.
+        """
+        chat_id = message.get("chat", {}).get("id")
+        message_id = message.get("message_id")
+        user = message.get("from", {})
+        user_id = user.get("id")
+        try:
+            self.api.delete_message(chat_id, message_id)
+        except TelegramAPIError as exc:
+            logger.warning("Failed to delete message %s in chat %s: %s", message_id, chat_id, exc)
+            return
+        if verdict.penalty == "delete" or user_id is None:
+            logger.info("Deleted message %s in chat %s (category %s)", message_id, chat_id, verdict.category)
+            return
+        user_display = self._format_user(user)
+        # Plain text here; _enforce_mute escapes it when its notice is HTML
+        detected = keyword_body(verdict.matched_keywords[0])
+        if verdict.penalty == "ban":
+            reason = f"{user_display} заблокирован за нарушение: «{detected}»."
+            self._enforce_ban(chat_id, user_id, user_display, 0, reason=reason)
+        elif verdict.penalty == "mute":
+            self._enforce_mute(chat_id, user, detected)
+
+    def _enforce_mute(self, chat_id: int, user: Dict[str, Any], detected: str) -> None:
+        user_id = user.get("id")
+        user_display = self._format_user(user)
+        if not self._can_ban(chat_id, user_id):
+            self._notify_admins(f"Не удалось ограничить {user_display}: админ или недостаточно прав.")
+            return
+        seconds = getattr(self.config, "mute_seconds", 3600)
+        permissions = {
+            "can_send_messages": False,
+            "can_send_audios": False,
+            "can_send_documents": False,
+            "can_send_photos": False,
+            "can_send_videos": False,
+            "can_send_video_notes": False,
+            "can_send_voice_notes": False,
+            "can_send_polls": False,
+            "can_send_other_messages": False,
+            "can_add_web_page_previews": False,
+        }
+        try:
+            self.api.restrict_chat_member(chat_id, user_id, permissions, until_date=int(time.time()) + seconds)
+        except TelegramAPIError as exc:
+            logger.warning("Failed to mute user %s in chat %s: %s", user_id, chat_id, exc)
+            self._notify_admins(f"Ошибка ограничения {user_display} (id={user_id}) в чате {chat_id}: {exc}")
+            return
+        mention_text, parse_mode = self._build_mention(user)
+        if parse_mode == "HTML":
+            detected = self._escape_html(detected)
+        minutes = max(1, seconds // 60)
+        self._send_ephemeral(
+            chat_id,
+            f"{mention_text}, вы не можете писать {minutes} мин. за нарушение: «{detected}».",
+            parse_mode=parse_mode,
+        )
+
+    def _enforce_ban(
+        self,
+        chat_id: int,
+        user_id: int,
+        user_display: str,
+        warning_count: int,
+        reason: Optional[str] = None,
+    ) -> None:
         # Avoid trying to ban admins/owner first
         if not self._can_ban(chat_id, user_id):
             info = f"Не удалось заблокировать {user_display}: админ или недостаточно прав."
@@ -462,7 +715,7 @@ class ModerationBot:
 
         self.store.reset_warnings(chat_id, user_id)
 
-        ban_text = f"{user_display} заблокирован после {warning_count} предупреждений."
+        ban_text = reason or f"{user_display} заблокирован после {warning_count} предупреждений."
         self._send_ephemeral(chat_id, ban_text)
 
         admin_note = f"Пользователь {user_display} (id={user_id}) заблокирован в чате {chat_id}."
@@ -475,9 +728,20 @@ class ModerationBot:
             "/list_chats",
             "/add_keyword <слова через запятую>",
             "/remove_keyword <слова через запятую>",
-            "/list_keywords",
+            "/list_keywords [chat_id]",
+            "/add_exception <фразы через запятую>",
+            "/remove_exception <фразы через запятую>",
+            "/list_exceptions",
+            "/add_chat_keyword <chat_id> <слова через запятую>",
+            "/remove_chat_keyword <chat_id> <слова через запятую>",
+            "/set_match_mode <chat_id> <substring|word>",
+            "/set_category <категория> <" + "|".join(KEYWORD_ACTIONS) + ">",
+            "/remove_category <категория>",
+            "/add_category_keyword <категория> <слова через запятую>",
+            "/list_categories",
             "/warnings <chat_id> [user_id]",
             "/reset_warning <chat_id> <user_id>",
+            "/stats",
         ]
         text = "Выберите раздел: Чаты или Слова. Доступные команды:\n" + "\n".join(commands)
         self._show_root_menu(chat_id, text=text)
@@ -519,6 +783,7 @@ class ModerationBot:
             raise ValueError("Укажите слова через запятую")
         raw = " ".join(args)
         words = self._parse_words_csv(raw)
+        self._check_keywords(words)
         added = self.store.add_keywords(words)
         if added:
             self._send_to_chat(chat_id, f"Добавлено слов: {added}.", reply_markup=self._reply_keyboard("words"))
@@ -536,7 +801,116 @@ class ModerationBot:
         else:
             self._send_to_chat(chat_id, "Совпадений для удаления не найдено.", reply_markup=self._reply_keyboard("words"))
 
+    def _cmd_add_exception(self, chat_id: int, args: List[str]) -> None:
+        if not args:
+            raise ValueError("Укажите фразы-исключения через запятую")
+        phrases = self._parse_words_csv(" ".join(args))
+        added = self.store.add_exceptions(phrases)
+        if added:
+            self._send_to_chat(chat_id, f"Добавлено исключений: {added}.", reply_markup=self._reply_keyboard("words"))
+        else:
+            self._send_to_chat(chat_id, "Новые исключения не обнаружены.", reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_remove_exception(self, chat_id: int, args: List[str]) -> None:
+        if not args:
+            raise ValueError("Укажите фразы-исключения через запятую для удаления")
+        phrases = self._parse_words_csv(" ".join(args))
+        removed = self.store.remove_exceptions(phrases)
+        if removed:
+            self._send_to_chat(chat_id, f"Удалено исключений: {removed}.", reply_markup=self._reply_keyboard("words"))
+        else:
+            self._send_to_chat(chat_id, "Совпадений для удаления не найдено.", reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_list_exceptions(self, chat_id: int, _: List[str]) -> None:
+        phrases = self.store.list_exceptions()
+        if not phrases:
+            self._send_to_chat(chat_id, "Список исключений пуст.", reply_markup=self._reply_keyboard("words"))
+            return
+        self._send_to_chat(chat_id, "Исключения:\n" + "\n".join(phrases), reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_add_chat_keyword(self, chat_id: int, args: List[str]) -> None:
+        if len(args) < 2:
+            raise ValueError("Укажите chat_id и слова через запятую")
+        target_chat_id = self._parse_int(args[0], "chat_id")
+        if not self.store.is_chat_moderated(target_chat_id):
+            raise ValueError(f"Чат {target_chat_id} не модерируется")
+        words = self._parse_words_csv(" ".join(args[1:]))
+        self._check_keywords(words)
+        added = self.store.add_chat_keywords(target_chat_id, words)
+        if added:
+            self._send_to_chat(chat_id, f"Добавлено слов для чата {target_chat_id}: {added}.", reply_markup=self._reply_keyboard("words"))
+        else:
+            self._send_to_chat(chat_id, "Новые слова не обнаружены.", reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_remove_chat_keyword(self, chat_id: int, args: List[str]) -> None:
+        if len(args) < 2:
+            raise ValueError("Укажите chat_id и слова через запятую для удаления")
+        target_chat_id = self._parse_int(args[0], "chat_id")
+        words = self._parse_words_csv(" ".join(args[1:]))
+        removed = self.store.remove_chat_keywords(target_chat_id, words)
+        if removed:
+            self._send_to_chat(chat_id, f"Удалено слов для чата {target_chat_id}: {removed}.", reply_markup=self._reply_keyboard("words"))
+        else:
+            self._send_to_chat(chat_id, "Совпадений для удаления не найдено.", reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_set_match_mode(self, chat_id: int, args: List[str]) -> None:
+        if len(args) < 2:
+            raise ValueError("Укажите chat_id и режим: " + ", ".join(MATCH_MODES))
+        target_chat_id = self._parse_int(args[0], "chat_id")
+        mode = args[1].strip().lower()
+        if mode not in MATCH_MODES:
+            raise ValueError("Режим должен быть одним из: " + ", ".join(MATCH_MODES))
+        if self.store.set_chat_match_mode(target_chat_id, mode):
+            self._send_to_chat(chat_id, f"Режим поиска для чата {target_chat_id}: {mode}.", reply_markup=self._reply_keyboard("words"))
+        else:
+            self._send_to_chat(chat_id, f"Чат {target_chat_id} не модерируется.", reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_set_category(self, chat_id: int, args: List[str]) -> None:
+        if len(args) < 2:
+            raise ValueError("Укажите категорию и действие: " + ", ".join(KEYWORD_ACTIONS))
+        name = args[0].strip().casefold()
+        action = args[1].strip().lower()
+        created = self.store.set_category(name, action)
+        state = "создана" if created else "обновлена"
+        self._send_to_chat(chat_id, f"Категория {name} {state}: {action}.", reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_remove_category(self, chat_id: int, args: List[str]) -> None:
+        if not args:
+            raise ValueError("Укажите категорию")
+        name = args[0].strip().casefold()
+        if self.store.remove_category(name):
+            self._send_to_chat(chat_id, f"Категория {name} удалена, её слова без категории.", reply_markup=self._reply_keyboard("words"))
+        else:
+            self._send_to_chat(chat_id, f"Категория {name} не найдена.", reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_add_category_keyword(self, chat_id: int, args: List[str]) -> None:
+        if len(args) < 2:
+            raise ValueError("Укажите категорию и слова через запятую")
+        name = args[0].strip().casefold()
+        words = self._parse_words_csv(" ".join(args[1:]))
+        self._check_keywords(words)
+        changed = self.store.add_category_keywords(name, words)
+        if changed:
+            self._send_to_chat(chat_id, f"Слов в категории {name}: +{changed}.", reply_markup=self._reply_keyboard("words"))
+        else:
+            self._send_to_chat(chat_id, "Все слова уже в этой категории.", reply_markup=self._reply_keyboard("words"))
+
+    def _cmd_list_categories(self, chat_id: int, _: List[str]) -> None:
+        lines = [
+            f"{name}: {action} (слов: {len(self.store.list_category_keywords(name))})"
+            for name, action in sorted(self.store.list_categories().items())
+        ]
+        self._send_to_chat(chat_id, "Категории:\n" + "\n".join(lines), reply_markup=self._reply_keyboard("words"))
+
     def _cmd_list_keywords(self, chat_id: int, args: List[str]) -> None:
+        if args:
+            target_chat_id = self._parse_int(args[0], "chat_id")
+            keywords = list(self.store.get_chat_keywords(target_chat_id))
+            if not keywords:
+                self._send_to_chat(chat_id, f"У чата {target_chat_id} нет собственных ключевых слов.", reply_markup=self._reply_keyboard("words"))
+                return
+            self._send_to_chat(chat_id, f"Ключевые слова чата {target_chat_id}:\n" + "\n".join(keywords), reply_markup=self._reply_keyboard("words"))
+            return
         keywords = self.store.list_global_keywords()
         if not keywords:
             self._send_to_chat(chat_id, "Список ключевых слов пуст.", reply_markup=self._reply_keyboard("words"))
@@ -569,6 +943,21 @@ class ModerationBot:
         else:
             self._send_to_chat(chat_id, "Предупреждений не найдено или чат не модерируется.", reply_markup=self._reply_keyboard())
 
+    def _cmd_stats(self, chat_id: int, _: List[str]) -> None:
+        cache = self._verdict_cache
+        lines = [
+            f"Кэш вердиктов: {len(cache)} записей, попаданий {cache.hits}, промахов {cache.misses} "
+            f"({cache.hit_ratio:.1%}).",
+            f"Кластеров дубликатов в окне: {len(self._duplicates)}.",
+            f"Движок поиска ключевых слов: {self.store.snapshot().matcher.engine_name}.",
+        ]
+        for name, stats in self.store.lock_stats().items():
+            lines.append(
+                f"Блокировка {name}: захватов {stats['acquisitions']}, с ожиданием {stats['contended']}, "
+                f"ожидание {stats['wait_ms']:.1f} мс (макс. {stats['max_wait_ms']:.1f} мс)."
+            )
+        self._send_to_chat(chat_id, "Статистика:\n" + "\n".join(lines), reply_markup=self._reply_keyboard())
+
     def _notify_admins(self, text: str) -> None:
         for admin_chat in self.config.admin_chat_ids:
             try:
@@ -652,7 +1041,11 @@ class ModerationBot:
         - "слово1, слово2,слово1" -> ["слово1", "слово2"]
         - Empty items are ignored.
         """
-        parts = [p.strip() for p in (raw or "").split(",")]
+        raw = (raw or "").strip()
+        # A regex keyword is taken whole: commas are part of the pattern ("\d{3,}")
+        if raw[:len(REGEX_PREFIX)].casefold() == REGEX_PREFIX:
+            return [raw]
+        parts = [p.strip() for p in raw.split(",")]
         parts = [p for p in parts if p]
         seen = set()
         result: List[str] = []
@@ -664,6 +1057,11 @@ class ModerationBot:
             result.append(p)
         return result
 
+    def _check_keywords(self, words: List[str]) -> None:
+        errors = [f"{word}: {error}" for word in words for error in [keyword_error(word)] if error]
+        if errors:
+            raise ValueError("Некорректные шаблоны:\n" + "\n".join(errors))
+
     def _parse_int(self, raw: str, field: str) -> int:
         try:
             return int(raw)
@@ -929,4 +1327,4 @@ class ModerationBot:
                 pass
 
 
-__all__ = ["ModerationBot"]
+__all__ = ["ModerationBot", "ModerationVerdict"]
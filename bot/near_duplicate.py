@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .text_normalize import normalize_text
+
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+class _Cluster:
+    __slots__ = ("signature", "band_keys", "chats", "last_seen", "flagged")
+
+    def __init__(self, signature: Tuple[int, ...], band_keys: List[Tuple[int, int]]) -> None:
+        self.signature = signature
+        self.band_keys = band_keys
+        # chat_id -> last time this near-duplicate was seen there
+        self.chats: Dict[int, float] = {}
+        self.last_seen = 0.0
+        self.flagged = False
+
+
+class NearDuplicateIndex:
+    """Rolling MinHash/LSH index of recent messages across all moderated chats.
+
+    Every text is reduced to a MinHash signature over character shingles and
+    bucketed by LSH bands, so finding earlier near-duplicates costs a handful
+    of dict lookups regardless of how many messages are indexed. A cluster of
+    near-duplicates is flagged once it has been seen in ``chat_threshold``
+    distinct chats within ``window_seconds``; from then on every copy is
+    reported as spam. Clusters idle for longer than the window are evicted,
+    and at most ``max_entries`` clusters are kept (least recently seen first).
+    Texts shorter than ``min_words`` words are not indexed: greetings and
+    one-liners repeat across chats without being spam.
+    """
+
+    def __init__(
+        self,
+        chat_threshold: int = 3,
+        window_seconds: float = 60.0,
+        max_entries: int = 10000,
+        min_words: int = 5,
+        bands: int = 8,
+        rows: int = 4,
+        shingle_size: int = 4,
+        similarity: float = 0.7,
+        seed: int = 1,
+    ) -> None:
+        self._chat_threshold = chat_threshold
+        self._window = window_seconds
+        self._max_entries = max_entries
+        self._min_words = min_words
+        self._bands = bands
+        self._rows = rows
+        self._shingle_size = shingle_size
+        self._similarity = similarity
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(bands * rows)
+        ]
+        self._clusters: "OrderedDict[int, _Cluster]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    def _signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        # Confusable folding plus word-level normalization drops look-alike
+        # letters, punctuation/emoji padding and whitespace tricks before shingling.
+        words = _WORD_RE.findall(normalize_text(text))
+        normalized = " ".join(words)
+        size = self._shingle_size
+        if len(words) < self._min_words or len(normalized) < size * 2:
+            return None
+        hashes = {zlib.crc32(normalized[i:i + size].encode("utf-8")) for i in range(len(normalized) - size + 1)}
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        rows = self._rows
+        return [(band, hash(signature[band * rows:(band + 1) * rows])) for band in range(self._bands)]
+
+    def _evict(self, now: float) -> None:
+        while self._clusters:
+            cluster_id, cluster = next(iter(self._clusters.items()))
+            if now - cluster.last_seen <= self._window and len(self._clusters) <= self._max_entries:
+                break
+            self._clusters.popitem(last=False)
+            for key in cluster.band_keys:
+                if self._buckets.get(key) == cluster_id:
+                    del self._buckets[key]
+
+    def observe(self, chat_id: int, text: str, now: float) -> bool:
+        """Index ``text`` seen in ``chat_id``; return True if it is cross-chat spam."""
+        if self._chat_threshold <= 0:
+            return False
+        signature = self._signature(text)
+        if signature is None:
+            return False
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            self._evict(now)
+            cluster_id = None
+            for key in band_keys:
+                candidate_id = self._buckets.get(key)
+                if candidate_id is None:
+                    continue
+                candidate = self._clusters.get(candidate_id)
+                if candidate is None:
+                    continue
+                same = sum(1 for x, y in zip(signature, candidate.signature) if x == y)
+                if same >= self._similarity * len(signature):
+                    cluster_id = candidate_id
+                    break
+            if cluster_id is None:
+                cluster_id = self._next_id
+                self._next_id += 1
+                cluster = _Cluster(signature, band_keys)
+                self._clusters[cluster_id] = cluster
+                for key in band_keys:
+                    self._buckets.setdefault(key, cluster_id)
+            else:
+                cluster = self._clusters[cluster_id]
+                self._clusters.move_to_end(cluster_id)
+            cluster.last_seen = now
+            cluster.chats[chat_id] = now
+            for seen_chat, seen_at in list(cluster.chats.items()):
+                if now - seen_at > self._window:
+                    del cluster.chats[seen_chat]
+            if len(cluster.chats) >= self._chat_threshold:
+                cluster.flagged = True
+            if len(self._clusters) > self._max_entries:
+                self._evict(now)
+            return cluster.flagged
+
+
+__all__ = ["NearDuplicateIndex"]
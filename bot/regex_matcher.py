@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import re
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+_FLAGS = re.IGNORECASE
+
+
+def wildcard_to_regex(mask: str) -> str:
+    """Translate a wildcard mask (``*`` any run of non-space, ``?`` one) to a regex."""
+    parts = []
+    for ch in mask:
+        if ch == "*":
+            parts.append(r"\S*")
+        elif ch == "?":
+            parts.append(r"\S")
+        else:
+            parts.append(re.escape(ch))
+    return "".join(parts)
+
+
+def pattern_error(pattern: str) -> Optional[str]:
+    """Return the compile error of ``pattern``, or None if it is a valid regex."""
+    if not pattern:
+        return "пустой шаблон"
+    try:
+        compiled = re.compile(pattern, _FLAGS)
+    except re.error as exc:
+        return str(exc)
+    if compiled.match(""):
+        return "шаблон совпадает с пустой строкой"
+    return None
+
+
+# Numbered backreferences and group conditions refer to group numbers,
+# which shift once patterns are joined; such patterns never join the
+# prefilter. Over-matching (e.g. an escaped backslash before a digit) only
+# costs speed.
+_GROUP_NUMBER_RE = re.compile(r"\\[1-9]|\(\?\(")
+
+# One bucket: the joined prefilter (None: scan every pattern) and each
+# pattern compiled on its own
+_Group = Tuple[Optional[Pattern[str]], Tuple[Pattern[str], ...]]
+
+
+@lru_cache(maxsize=256)
+def _compile_group(patterns: Tuple[str, ...]) -> Tuple[_Group, ...]:
+    """Compile one bucket into prefiltered groups of patterns.
+
+    Joinable patterns share one alternation that is only used to find out
+    whether, and from where, any of them can hit; the hits themselves come
+    from each pattern's own ``finditer``, so overlapping matches of
+    different patterns are all reported. Cached by the exact pattern tuple,
+    so a bucket whose patterns did not change is reused as is when the
+    keyword list is edited.
+    """
+    compiled = tuple(re.compile(pattern, _FLAGS) for pattern in patterns)
+    solitary = tuple(regex for regex, pattern in zip(compiled, patterns) if _GROUP_NUMBER_RE.search(pattern))
+    joinable = [(regex, pattern) for regex, pattern in zip(compiled, patterns) if not _GROUP_NUMBER_RE.search(pattern)]
+    groups: List[_Group] = []
+    if joinable:
+        try:
+            prefilter: Optional[Pattern[str]] = re.compile(
+                "|".join(f"(?:{pattern})" for _, pattern in joinable), _FLAGS
+            )
+        except re.error:
+            # Clashing group names do not survive being joined; scan those one by one.
+            prefilter = None
+        groups.append((prefilter, tuple(regex for regex, _ in joinable)))
+    if solitary:
+        groups.append((None, solitary))
+    return tuple(groups)
+
+
+class RegexMatcher:
+    """Regex keywords compiled into a few combined alternations.
+
+    Patterns are spread over ``buckets`` groups by the crc32 of their source,
+    and each group is prefiltered by one ``re`` alternation, so a text that
+    hits nothing costs one C-level ``search`` per non-empty group instead of
+    one per pattern. Only when the alternation hits are the group's patterns
+    run one by one, from the first hit on, and every pattern reports its own
+    matches even where they overlap another pattern's. Compiled groups are
+    memoized by content: editing one keyword recompiles only the group it
+    hashes into.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]], buckets: int = 8) -> None:
+        # patterns: (keyword as entered, regex source)
+        grouped: List[Dict[str, str]] = [{} for _ in range(buckets)]
+        for keyword, pattern in patterns:
+            error = pattern_error(pattern)
+            if error is not None:
+                logger.warning("Skipping invalid regex keyword %r: %s", keyword, error)
+                continue
+            bucket = grouped[zlib.crc32(pattern.encode("utf-8")) % buckets]
+            bucket.setdefault(pattern, keyword)
+        self._groups: List[Tuple[Optional[Pattern[str]], Tuple[Tuple[Pattern[str], str], ...]]] = []
+        self._keywords: List[str] = []
+        for bucket in grouped:
+            if not bucket:
+                continue
+            ordered = tuple(sorted(bucket))
+            keywords = {re_pattern: bucket[re_pattern] for re_pattern in ordered}
+            for prefilter, members in _compile_group(ordered):
+                self._groups.append((prefilter, tuple((regex, keywords[regex.pattern]) for regex in members)))
+            self._keywords.extend(keywords.values())
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def __bool__(self) -> bool:
+        return bool(self._keywords)
+
+    @property
+    def keywords(self) -> List[str]:
+        return list(self._keywords)
+
+    def find_all(self, text: str) -> List[Tuple[str, int, int]]:
+        """Return ``(keyword, start, end)`` for every pattern hit in ``text``."""
+        matches: List[Tuple[str, int, int]] = []
+        for prefilter, members in self._groups:
+            start = 0
+            if prefilter is not None:
+                first = prefilter.search(text)
+                if first is None:
+                    continue
+                # No pattern of the group can hit left of the leftmost hit
+                start = first.start()
+            for regex, keyword in members:
+                for match in regex.finditer(text, start):
+                    matches.append((keyword, match.start(), match.end()))
+        return matches
+
+
+__all__ = ["RegexMatcher", "pattern_error", "wildcard_to_regex"]
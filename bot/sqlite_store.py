@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .categories import DEFAULT_CATEGORIES
+from .locks import TimedLock, lock_stats
+from .state_reader import decode_warnings, read_state
+from .store_base import BaseModerationStore
+
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chats (
+        chat_id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL DEFAULT '',
+        keywords TEXT NOT NULL DEFAULT '[]',
+        match_mode TEXT NOT NULL DEFAULT 'substring'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS keywords (
+        position INTEGER PRIMARY KEY AUTOINCREMENT,
+        keyword TEXT NOT NULL,
+        folded TEXT NOT NULL UNIQUE,
+        category TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        name TEXT PRIMARY KEY,
+        action TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS exceptions (
+        position INTEGER PRIMARY KEY AUTOINCREMENT,
+        phrase TEXT NOT NULL,
+        folded TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS warning_events (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        issued_at INTEGER NOT NULL
+    )
+    """,
+    # Active counts are range scans of one user's warnings
+    "CREATE INDEX IF NOT EXISTS warning_events_user ON warning_events (chat_id, user_id, issued_at)",
+    # Expiry deletes a prefix of this index, touching only expired rows
+    "CREATE INDEX IF NOT EXISTS warning_events_time ON warning_events (issued_at)",
+)
+
+# Statements are kept as constants so every per-thread connection hits its
+# own prepared-statement cache instead of re-parsing SQL.
+_SQL_INSERT_CHAT = "INSERT OR IGNORE INTO chats (chat_id) VALUES (?)"
+_SQL_SET_TITLE = "UPDATE chats SET title = ? WHERE chat_id = ?"
+_SQL_DELETE_CHAT = "DELETE FROM chats WHERE chat_id = ?"
+_SQL_DELETE_CHAT_WARNINGS = "DELETE FROM warning_events WHERE chat_id = ?"
+_SQL_SELECT_CHATS = "SELECT chat_id, title, keywords, match_mode FROM chats"
+_SQL_SELECT_CHAT_KEYWORDS = "SELECT keywords FROM chats WHERE chat_id = ?"
+_SQL_SET_CHAT_KEYWORDS = "UPDATE chats SET keywords = ? WHERE chat_id = ?"
+_SQL_SET_MATCH_MODE = "UPDATE chats SET match_mode = ? WHERE chat_id = ?"
+_SQL_SELECT_KEYWORDS = "SELECT keyword, category FROM keywords ORDER BY position"
+_SQL_INSERT_KEYWORD = "INSERT OR IGNORE INTO keywords (keyword, folded) VALUES (?, ?)"
+_SQL_DELETE_KEYWORD = "DELETE FROM keywords WHERE folded = ?"
+_SQL_SELECT_EXCEPTIONS = "SELECT phrase FROM exceptions ORDER BY position"
+_SQL_INSERT_EXCEPTION = "INSERT OR IGNORE INTO exceptions (phrase, folded) VALUES (?, ?)"
+_SQL_DELETE_EXCEPTION = "DELETE FROM exceptions WHERE folded = ?"
+_SQL_SELECT_CATEGORIES = "SELECT name, action FROM categories"
+_SQL_SELECT_CATEGORY = "SELECT action FROM categories WHERE name = ?"
+_SQL_SET_CATEGORY = "INSERT OR REPLACE INTO categories (name, action) VALUES (?, ?)"
+_SQL_DELETE_CATEGORY = "DELETE FROM categories WHERE name = ?"
+_SQL_CLEAR_CATEGORY = "UPDATE keywords SET category = NULL WHERE category = ?"
+_SQL_SET_KEYWORD_CATEGORY = "UPDATE keywords SET category = ? WHERE folded = ? AND category IS NOT ?"
+_SQL_INSERT_WARNING = "INSERT INTO warning_events (chat_id, user_id, issued_at) VALUES (?, ?, ?)"
+_SQL_DELETE_WARNING = "DELETE FROM warning_events WHERE chat_id = ? AND user_id = ?"
+_SQL_SELECT_WARNING = "SELECT COUNT(*) FROM warning_events WHERE chat_id = ? AND user_id = ? AND issued_at > ?"
+_SQL_SELECT_CHAT_WARNINGS = (
+    "SELECT user_id, COUNT(*) FROM warning_events WHERE chat_id = ? AND issued_at > ? GROUP BY user_id"
+)
+_SQL_SELECT_ALL_WARNINGS = (
+    "SELECT chat_id, user_id, COUNT(*) FROM warning_events WHERE issued_at > ? GROUP BY chat_id, user_id"
+)
+_SQL_EXPIRE_WARNINGS = "DELETE FROM warning_events WHERE issued_at <= ?"
+_SQL_GET_META = "SELECT value FROM meta WHERE key = ?"
+_SQL_SET_META = "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)"
+
+
+class SQLiteModerationStore(BaseModerationStore):
+    """SQLite-backed moderation storage.
+
+    Runs the database in WAL mode with one connection per thread. Each warning
+    is one ``(chat_id, user_id, issued_at)`` row, so recording a violation
+    inserts a single indexed row no matter how large the state grows; active
+    counts are index range scans and expiry deletes a prefix of the
+    ``issued_at`` index.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        migrate_from: Optional[str] = None,
+        fuzzy_distance: int = 0,
+        warning_ttl: int = 0,
+    ) -> None:
+        self._path = Path(db_path)
+        self._warning_ttl = max(0, warning_ttl)
+        self._fuzzy_distance = fuzzy_distance
+        self._matcher_cache_path = self._path.with_name(self._path.name + ".matcher")
+        directory = self._path.parent
+        if directory and not directory.exists():
+            directory.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        # Serializes chat/keyword writers so snapshots are published in order
+        self._write_lock = TimedLock()
+        conn = self._conn()
+        with conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        if migrate_from and conn.execute(_SQL_GET_META, ("migrated_from",)).fetchone() is None:
+            source = Path(migrate_from)
+            if source.exists():
+                migrate_json_to_sqlite(source, conn)
+        with self._write_lock:
+            self._publish_snapshot(rebuild_matcher=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                str(self._path),
+                check_same_thread=False,
+                cached_statements=64,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._write_lock:
+            self._persist_matcher()
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:  # pragma: no cover - best effort on shutdown
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _publish_snapshot(self, rebuild_matcher: bool = False, rebuild_chats: Tuple[int, ...] = ()) -> None:
+        """Re-read chats and keywords into a new snapshot; hold ``_write_lock``."""
+        conn = self._conn()
+        policies = {
+            int(chat_id): {"title": title, "keywords": json.loads(keywords), "match_mode": match_mode}
+            for chat_id, title, keywords, match_mode in conn.execute(_SQL_SELECT_CHATS)
+        }
+        keywords = []
+        keyword_categories = {}
+        for keyword, category in conn.execute(_SQL_SELECT_KEYWORDS):
+            keywords.append(keyword)
+            if category:
+                keyword_categories[keyword.casefold()] = category
+        exceptions = [row[0] for row in conn.execute(_SQL_SELECT_EXCEPTIONS)]
+        self._set_snapshot(
+            keywords,
+            policies,
+            rebuild_matcher,
+            rebuild_chats,
+            exceptions=exceptions,
+            categories=dict(conn.execute(_SQL_SELECT_CATEGORIES).fetchall()),
+            keyword_categories=keyword_categories,
+        )
+
+    def add_chat(self, chat_id: int, title: Optional[str] = None) -> bool:
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                created = conn.execute(_SQL_INSERT_CHAT, (chat_id,)).rowcount > 0
+                if title is not None:
+                    conn.execute(_SQL_SET_TITLE, (title, chat_id))
+            self._publish_snapshot()
+            return created
+
+    def update_chat_title(self, chat_id: int, title: str) -> None:
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(_SQL_INSERT_CHAT, (chat_id,))
+                conn.execute(_SQL_SET_TITLE, (title, chat_id))
+            self._publish_snapshot()
+
+    def remove_chat(self, chat_id: int) -> bool:
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                removed = conn.execute(_SQL_DELETE_CHAT, (chat_id,)).rowcount > 0
+                conn.execute(_SQL_DELETE_CHAT_WARNINGS, (chat_id,))
+            if removed:
+                self._publish_snapshot()
+            return removed
+
+    def list_chats(self) -> Dict[int, Dict[str, object]]:
+        snapshot = self.snapshot()
+        warnings: Dict[int, Dict[int, int]] = {}
+        for chat_id, user_id, count in self._conn().execute(_SQL_SELECT_ALL_WARNINGS, (self._cutoff(),)):
+            warnings.setdefault(chat_id, {})[user_id] = count
+        return {
+            chat_id: {
+                "title": policy.get("title", ""),
+                # Effective list: global keywords plus the chat's own overlay
+                "keywords": list(snapshot.keywords) + list(policy.get("keywords") or ()),
+                "warnings": warnings.get(chat_id, {}),
+            }
+            for chat_id, policy in snapshot.chat_policies.items()
+        }
+
+    def _insert_folded(self, statement: str, words: List[str]) -> int:
+        cleaned = [w.strip() for w in words if w and w.strip()]
+        if not cleaned:
+            return 0
+        with self._write_lock:
+            conn = self._conn()
+            added = 0
+            with conn:
+                for word in cleaned:
+                    added += conn.execute(statement, (word, word.casefold())).rowcount
+            if added:
+                self._publish_snapshot(rebuild_matcher=True)
+            return added
+
+    def _delete_folded(self, statement: str, words: List[str]) -> int:
+        targets = {w.strip().casefold() for w in words if w and w.strip()}
+        if not targets:
+            return 0
+        with self._write_lock:
+            conn = self._conn()
+            removed = 0
+            with conn:
+                for folded in targets:
+                    removed += conn.execute(statement, (folded,)).rowcount
+            if removed:
+                self._publish_snapshot(rebuild_matcher=True)
+            return removed
+
+    def add_keywords(self, words: List[str]) -> int:
+        return self._insert_folded(_SQL_INSERT_KEYWORD, words)
+
+    def remove_keywords(self, words: List[str]) -> int:
+        return self._delete_folded(_SQL_DELETE_KEYWORD, words)
+
+    def add_exceptions(self, phrases: List[str]) -> int:
+        return self._insert_folded(_SQL_INSERT_EXCEPTION, phrases)
+
+    def remove_exceptions(self, phrases: List[str]) -> int:
+        return self._delete_folded(_SQL_DELETE_EXCEPTION, phrases)
+
+    def set_category(self, name: str, action: str) -> bool:
+        self._check_category(name, action)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                created = conn.execute(_SQL_SELECT_CATEGORY, (name,)).fetchone() is None
+                conn.execute(_SQL_SET_CATEGORY, (name, action))
+            self._publish_snapshot()
+            return created and name not in DEFAULT_CATEGORIES
+
+    def remove_category(self, name: str) -> bool:
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                removed = conn.execute(_SQL_DELETE_CATEGORY, (name,)).rowcount
+                removed += conn.execute(_SQL_CLEAR_CATEGORY, (name,)).rowcount
+            if removed:
+                self._publish_snapshot()
+            return removed > 0
+
+    def add_category_keywords(self, name: str, words: List[str]) -> int:
+        cleaned = [w.strip() for w in words if w and w.strip()]
+        if not cleaned:
+            return 0
+        with self._write_lock:
+            self._require_category(name)
+            conn = self._conn()
+            added = changed = 0
+            with conn:
+                for word in cleaned:
+                    added += conn.execute(_SQL_INSERT_KEYWORD, (word, word.casefold())).rowcount
+                    changed += conn.execute(_SQL_SET_KEYWORD_CATEGORY, (name, word.casefold(), name)).rowcount
+            if changed:
+                self._publish_snapshot(rebuild_matcher=added > 0)
+            return changed
+
+    def _update_chat_keywords(self, chat_id: int, words: List[str], add: bool) -> int:
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                row = conn.execute(_SQL_SELECT_CHAT_KEYWORDS, (chat_id,)).fetchone()
+                if row is None:
+                    return 0
+                current: List[str] = json.loads(row[0])
+                if add:
+                    existing_cf = {w.casefold() for w in current}
+                    changed = []
+                    for word in words:
+                        if word.casefold() not in existing_cf:
+                            existing_cf.add(word.casefold())
+                            changed.append(word)
+                    current.extend(changed)
+                    count = len(changed)
+                else:
+                    to_remove_cf = {w.casefold() for w in words}
+                    before = len(current)
+                    current = [w for w in current if w.casefold() not in to_remove_cf]
+                    count = before - len(current)
+                if count:
+                    conn.execute(_SQL_SET_CHAT_KEYWORDS, (json.dumps(current, ensure_ascii=False), chat_id))
+            if count:
+                self._publish_snapshot(rebuild_chats=(chat_id,))
+            return count
+
+    def add_chat_keywords(self, chat_id: int, words: List[str]) -> int:
+        cleaned = [w.strip() for w in words if w and w.strip()]
+        return self._update_chat_keywords(chat_id, cleaned, add=True) if cleaned else 0
+
+    def remove_chat_keywords(self, chat_id: int, words: List[str]) -> int:
+        targets = [w.strip() for w in words if w and w.strip()]
+        return self._update_chat_keywords(chat_id, targets, add=False) if targets else 0
+
+    def set_chat_match_mode(self, chat_id: int, mode: str) -> bool:
+        self._check_match_mode(mode)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                updated = conn.execute(_SQL_SET_MATCH_MODE, (mode, chat_id)).rowcount > 0
+            if updated:
+                # Rebuilding the chat bumps keyword_version, so cached verdicts for the old mode expire
+                self._publish_snapshot(rebuild_chats=(chat_id,))
+            return updated
+
+    def _cutoff(self, now: Optional[float] = None) -> int:
+        cutoff = self._warning_cutoff(now)
+        # Issue times are positive, so -1 keeps every warning
+        return -1 if cutoff is None else cutoff
+
+    def increment_warning(self, chat_id: int, user_id: int) -> int:
+        conn = self._conn()
+        now = int(time.time())
+        with conn:
+            created = conn.execute(_SQL_INSERT_CHAT, (chat_id,)).rowcount > 0
+            conn.execute(_SQL_INSERT_WARNING, (chat_id, user_id, now))
+            count = conn.execute(_SQL_SELECT_WARNING, (chat_id, user_id, self._cutoff(now))).fetchone()[0]
+        if created:
+            with self._write_lock:
+                self._publish_snapshot()
+        return int(count)
+
+    def reset_warnings(self, chat_id: int, user_id: int) -> bool:
+        conn = self._conn()
+        with conn:
+            return conn.execute(_SQL_DELETE_WARNING, (chat_id, user_id)).rowcount > 0
+
+    def get_warning(self, chat_id: int, user_id: int) -> int:
+        row = self._conn().execute(_SQL_SELECT_WARNING, (chat_id, user_id, self._cutoff())).fetchone()
+        return int(row[0]) if row else 0
+
+    def get_all_warnings(self, chat_id: int) -> Dict[int, int]:
+        rows = self._conn().execute(_SQL_SELECT_CHAT_WARNINGS, (chat_id, self._cutoff()))
+        return {int(uid): int(cnt) for uid, cnt in rows}
+
+    def expire_warnings(self, now: Optional[int] = None) -> int:
+        if not self._warning_ttl:
+            return 0
+        conn = self._conn()
+        with conn:
+            removed = conn.execute(_SQL_EXPIRE_WARNINGS, (self._cutoff(now),)).rowcount
+        if removed:
+            logger.info("Expired %s warnings older than %s s", removed, self._warning_ttl)
+        return removed
+
+    def lock_stats(self) -> Dict[str, Dict[str, float]]:
+        # Warning rows are guarded by SQLite itself; only chat/keyword writers share a lock
+        return {"write": lock_stats([self._write_lock])}
+
+
+def _iter_warning_rows(raw_warnings: Dict[int, Union[str, bytes]], legacy_time: int) -> Iterator[Tuple[int, int, int]]:
+    # One chat's warnings are decoded at a time while rows are consumed
+    for chat_id, raw in raw_warnings.items():
+        for user_id, times in decode_warnings(raw, legacy_time).items():
+            for issued_at in times:
+                yield chat_id, user_id, issued_at
+
+
+def migrate_json_to_sqlite(json_path: Path, conn: sqlite3.Connection) -> int:
+    """Copy a ``moderation_state.json`` file (JSON or binary) into an SQLite database.
+
+    Rows are streamed into ``executemany`` from generators in one transaction,
+    so no intermediate row lists are built. The source path is recorded in the
+    ``meta`` table and the migration is skipped on later starts. Returns the
+    number of warning rows copied.
+    """
+    legacy_time = int(time.time())
+    data, raw_warnings = read_state(json_path)
+    chats: Dict[str, Dict[str, object]] = data.get("moderated_chats", {})
+    keywords: List[str] = data.get("global_keywords", [])
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO chats (chat_id, title, keywords, match_mode) VALUES (?, ?, ?, ?)",
+            (
+                (
+                    int(chat_id_str),
+                    payload.get("title") or "",
+                    json.dumps(payload.get("keywords") or [], ensure_ascii=False),
+                    payload.get("match_mode") or "substring",
+                )
+                for chat_id_str, payload in chats.items()
+            ),
+        )
+        conn.executemany(_SQL_INSERT_KEYWORD, ((kw, kw.casefold()) for kw in keywords if kw))
+        conn.executemany(
+            "UPDATE keywords SET category = ? WHERE folded = ?",
+            ((category, folded) for folded, category in (data.get("keyword_categories") or {}).items()),
+        )
+        conn.executemany(_SQL_SET_CATEGORY, (data.get("categories") or {}).items())
+        conn.executemany(
+            _SQL_INSERT_EXCEPTION,
+            ((phrase, phrase.casefold()) for phrase in data.get("global_exceptions", []) if phrase),
+        )
+        cursor = conn.executemany(_SQL_INSERT_WARNING, _iter_warning_rows(raw_warnings, legacy_time))
+        migrated = cursor.rowcount
+        conn.execute(_SQL_SET_META, ("migrated_from", str(json_path)))
+    logger.info("Migrated %s chats and %s warning rows from %s", len(chats), migrated, json_path)
+    return migrated
+
+
+__all__ = ["SQLiteModerationStore", "migrate_json_to_sqlite"]
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+import time
+from json.decoder import scanstring
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from .binary_state import decode_state, is_binary_state, unpack_warnings
+
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_FLAT_OBJECT = re.compile(r'\{[ \t\n\r"0-9:,\-\[\]]*\}')
+_DECODER = json.JSONDecoder()
+
+
+def _skip(text: str, pos: int) -> int:
+    return _WHITESPACE.match(text, pos).end()
+
+
+def _expect(text: str, pos: int, char: str) -> int:
+    pos = _skip(text, pos)
+    if text[pos:pos + 1] != char:
+        raise json.JSONDecodeError(f"Expecting '{char}'", text, pos)
+    return pos + 1
+
+
+def _iter_object(text: str, pos: int):
+    """Yield ``(key, value_start)`` for an object starting at ``pos``.
+
+    The caller must advance past each value and send the new position back.
+    """
+    pos = _expect(text, pos, "{")
+    pos = _skip(text, pos)
+    if text[pos:pos + 1] == "}":
+        return pos + 1
+    while True:
+        pos = _expect(text, pos, '"')
+        key, pos = scanstring(text, pos)
+        pos = _skip(text, _expect(text, pos, ":"))
+        pos = yield key, pos
+        pos = _skip(text, pos)
+        if text[pos:pos + 1] == ",":
+            pos += 1
+            continue
+        return _expect(text, pos, "}")
+
+
+def _walk(text: str, pos: int, handle) -> int:
+    """Run ``handle(key, value_start) -> value_end`` over an object; return its end."""
+    walker = _iter_object(text, pos)
+    try:
+        key, value_pos = next(walker)
+        while True:
+            key, value_pos = walker.send(handle(key, value_pos))
+    except StopIteration as stop:
+        return stop.value
+
+
+def _skip_flat_object(text: str, pos: int) -> int:
+    # Warning objects only hold ``"user_id": [timestamps]`` pairs, which the pattern
+    # skips without building anything; anything else goes through the decoder.
+    match = _FLAT_OBJECT.match(text, pos)
+    if match is not None:
+        return match.end()
+    return _DECODER.raw_decode(text, pos)[1]
+
+
+def parse_state(text: str) -> Tuple[Dict[str, object], Dict[str, str]]:
+    """Parse a state document, leaving every chat's warnings undecoded.
+
+    Returns the document without the ``warnings`` objects and the raw JSON
+    text of each chat's warnings keyed by the chat id string. Skipping a
+    warnings object costs one substring search instead of building a dict
+    entry per user, which is what dominates loading a large state file.
+    """
+    data: Dict[str, object] = {}
+    raw_warnings: Dict[str, str] = {}
+
+    def chat_field(entry: Dict[str, object], chat_key: str):
+        def handle(key: str, pos: int) -> int:
+            if key == "warnings":
+                end = _skip_flat_object(text, pos)
+                if text[pos + 1:end - 1].strip():
+                    raw_warnings[chat_key] = text[pos:end]
+                return end
+            entry[key], end = _DECODER.raw_decode(text, pos)
+            return end
+        return handle
+
+    def chat(key: str, pos: int) -> int:
+        entry: Dict[str, object] = {}
+        chats[key] = entry
+        return _walk(text, pos, chat_field(entry, key))
+
+    chats: Dict[str, Dict[str, object]] = {}
+
+    def top(key: str, pos: int) -> int:
+        if key == "moderated_chats":
+            data[key] = chats
+            return _walk(text, pos, chat)
+        data[key], end = _DECODER.raw_decode(text, pos)
+        return end
+
+    end = _walk(text, _skip(text, 0), top)
+    if _skip(text, end) != len(text):
+        raise json.JSONDecodeError("Extra data", text, end)
+    return data, raw_warnings
+
+
+def read_state(path: Path) -> Tuple[Dict[str, object], Dict[int, Union[str, bytes]]]:
+    """Read a JSON or binary state file, leaving warnings undecoded.
+
+    Raw warnings are keyed by chat id: JSON text for JSON files, packed
+    arrays for binary ones; :func:`decode_warnings` accepts both.
+    """
+    with path.open("rb") as fh:
+        blob = fh.read()
+    if is_binary_state(blob):
+        data, packed = decode_state(blob)
+        return data, dict(packed)
+    data, raw_warnings = parse_state(blob.decode("utf-8"))
+    return data, {int(chat_id_str): raw for chat_id_str, raw in raw_warnings.items()}
+
+
+def is_timestamped(raw: str) -> bool:
+    """True when raw JSON warnings hold issue-time lists only, no legacy counts.
+
+    In a flat warnings object every ``"user_id": [...]`` pair has one colon
+    and one opening bracket, so comparing the counts needs no parsing.
+    """
+    return _FLAT_OBJECT.fullmatch(raw) is not None and raw.count(":") == raw.count("[")
+
+
+def decode_warnings(raw: Union[str, bytes], legacy_time: Optional[int] = None) -> Dict[int, List[int]]:
+    """Decode one chat's raw warnings into ``user_id -> ascending issue times``.
+
+    Plain counts from files written before warnings were timestamped count
+    as issued at ``legacy_time`` (default: now).
+    """
+    if isinstance(raw, bytes):
+        return unpack_warnings(raw)
+    try:
+        result: Dict[int, List[int]] = {}
+        for uid, value in json.loads(raw).items():
+            if isinstance(value, list):
+                result[int(uid)] = sorted(int(issued_at) for issued_at in value)
+            else:
+                if legacy_time is None:
+                    legacy_time = int(time.time())
+                result[int(uid)] = [legacy_time] * int(value)
+        return result
+    except (ValueError, AttributeError, TypeError) as exc:
+        logger.warning("Ignoring unreadable warnings entry: %s", exc)
+        return {}
+
+
+__all__ = ["decode_warnings", "is_timestamped", "parse_state", "read_state"]
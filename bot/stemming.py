@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .text_normalize import normalize_text
+
+# Inflectional endings of Russian nouns, adjectives, pronouns and verbs.
+_INFLECTIONS = (
+    "", "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+    "ой", "ей", "ою", "ею", "ом", "ем", "ам", "ям", "ами", "ями", "ах", "ях", "ов", "ев", "ью", "ьи", "ья", "ье", "ьям", "ьями", "ьях", "ьев",
+    "ый", "ий", "ая", "яя", "ое", "ее", "ые", "ие", "ого", "его", "ому", "ему", "ым", "им", "ую", "юю", "ых", "их", "ыми", "ими",
+    "ть", "ти", "ться", "тся", "ешь", "ет", "ете", "ут", "ют", "ишь", "ит", "ите", "ат", "ят", "ем", "им",
+    "л", "ла", "ло", "ли", "лся", "лась", "лось", "лись", "йте", "ся", "сь",
+)
+
+# Diminutive/augmentative suffixes that commonly sit between the stem and the
+# ending in profanity ("поп-к-а", "сись-ечк-и", "жоп-ищ-е").
+_DERIVATIONAL = ("", "к", "ек", "ок", "ечк", "очк", "еньк", "оньк", "ищ", "ушк", "юшк", "ул", "ульк", "ан", "ян")
+
+
+def _build_endings() -> FrozenSet[str]:
+    return frozenset(normalize_text(suffix + ending) for suffix in _DERIVATIONAL for ending in _INFLECTIONS)
+
+
+RUSSIAN_ENDINGS: FrozenSet[str] = _build_endings()
+
+_TERMINAL = ""
+
+
+class StemMatcher:
+    """Suffix-aware trie of keyword stems.
+
+    A token matches when it starts with a stored stem and the rest of the
+    token is a known Russian suffix+ending combination, so one stem such as
+    ``жоп`` covers "жопа", "жопой", "жопки", "жопище" and so on. Each token
+    costs one walk down the trie plus a set lookup per stem boundary reached.
+    """
+
+    def __init__(self, stems: Iterable[Tuple[str, str]], endings: FrozenSet[str] = RUSSIAN_ENDINGS) -> None:
+        # stems: (keyword as entered, stem body)
+        self._root: Dict[str, dict] = {}
+        self._endings = endings
+        self._keywords: List[str] = []
+        for keyword, stem in stems:
+            normalized = normalize_text(stem)
+            if not normalized:
+                continue
+            node = self._root
+            for ch in normalized:
+                node = node.setdefault(ch, {})
+            if _TERMINAL not in node:
+                node[_TERMINAL] = keyword
+                self._keywords.append(keyword)
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def __bool__(self) -> bool:
+        return bool(self._keywords)
+
+    @property
+    def keywords(self) -> List[str]:
+        return list(self._keywords)
+
+    def match_token(self, token: str) -> Optional[str]:
+        """Return the keyword whose stem inflects to ``token``, longest stem first."""
+        node = self._root
+        endings = self._endings
+        found: Optional[str] = None
+        for idx, ch in enumerate(token):
+            node = node.get(ch)
+            if node is None:
+                break
+            keyword = node.get(_TERMINAL)
+            if keyword is not None and token[idx + 1:] in endings:
+                found = keyword
+        return found
+
+    def find_all(self, tokens: List[Tuple[str, int]]) -> List[Tuple[str, int, int]]:
+        """Return ``(keyword, start, end)`` for every matching ``(token, offset)``."""
+        if not self._keywords:
+            return []
+        matches: List[Tuple[str, int, int]] = []
+        match_token = self.match_token
+        for token, offset in tokens:
+            keyword = match_token(token)
+            if keyword is not None:
+                matches.append((keyword, offset, offset + len(token)))
+        return matches
+
+
+__all__ = ["RUSSIAN_ENDINGS", "StemMatcher"]
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .categories import DEFAULT_ACTION, DEFAULT_CATEGORIES, KEYWORD_ACTIONS, category_error
+from .flat_automaton import automaton_key, load_automaton, save_automaton
+from .fuzzy_matcher import FuzzyIndex
+from .keyword_matcher import MATCH_MODES, KeywordMatcher, fuzzy_terms
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoreSnapshot:
+    """Immutable view of the read-mostly moderation state.
+
+    Published by writers after every chat/keyword mutation; readers grab the
+    current instance without locking and never observe a half-applied change.
+    """
+
+    version: int
+    # Bumped only when a keyword set (and so a matcher) changes
+    keyword_version: int
+    moderated_chat_ids: FrozenSet[int]
+    keywords: Tuple[str, ...]
+    # Allowlisted phrases that cancel overlapping keyword hits
+    exceptions: Tuple[str, ...]
+    matcher: KeywordMatcher
+    # chat_id -> chat settings (everything except warnings)
+    chat_policies: Mapping[int, Mapping[str, object]]
+    # chat_id -> overlay matcher, only for chats with their own keywords
+    chat_matchers: Mapping[int, KeywordMatcher]
+    # category -> action, built-in categories included
+    categories: Mapping[str, str] = field(default_factory=lambda: MappingProxyType(dict(DEFAULT_CATEGORIES)))
+    # casefolded global keyword -> category
+    keyword_categories: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+
+    def chat_keywords(self, chat_id: int) -> Tuple[str, ...]:
+        policy = self.chat_policies.get(chat_id)
+        return tuple(policy.get("keywords") or ()) if policy else ()
+
+    def chat_match_mode(self, chat_id: int) -> str:
+        policy = self.chat_policies.get(chat_id)
+        return str(policy.get("match_mode") or "substring") if policy else "substring"
+
+    def keyword_action(self, keywords: Iterable[str]) -> Tuple[Optional[str], str]:
+        """Return the category and action of the harshest of the matched ``keywords``.
+
+        Uncategorized keywords (and categories that no longer exist) get
+        ``DEFAULT_ACTION``; the category is None when none of them has one.
+        """
+        result: Tuple[Optional[str], str] = (None, DEFAULT_ACTION)
+        rank = -1
+        for keyword in keywords:
+            category = self.keyword_categories.get(keyword.casefold())
+            action = self.categories.get(category) if category else None
+            if action is None:
+                category, action = None, DEFAULT_ACTION
+            if KEYWORD_ACTIONS.index(action) > rank:
+                result, rank = (category, action), KEYWORD_ACTIONS.index(action)
+        return result
+
+
+class BaseModerationStore(ABC):
+    """Public surface shared by all moderation storage backends.
+
+    Backends implement the mutations and warning queries; hot-path reads
+    (``is_chat_moderated``, ``get_keywords``, ``get_matcher``) are served from
+    the published :class:`StoreSnapshot` and shared here.
+    """
+
+    _snapshot: Optional[StoreSnapshot] = None
+    # Maximum edit distance for typo-tolerant keyword matching; 0 disables it
+    _fuzzy_distance: int = 0
+    # Where the compiled global automaton is persisted; None disables it
+    _matcher_cache_path: Optional[Path] = None
+    # Key of the automaton currently on disk
+    _matcher_cache_key: Optional[bytes] = None
+    # Seconds after which a warning stops counting; 0 keeps warnings forever
+    _warning_ttl: int = 0
+
+    @abstractmethod
+    def add_chat(self, chat_id: int, title: Optional[str] = None) -> bool:
+        """Start moderating a chat; return True if it was not moderated yet."""
+
+    @abstractmethod
+    def update_chat_title(self, chat_id: int, title: str) -> None:
+        """Remember the human-readable title of a chat."""
+
+    @abstractmethod
+    def remove_chat(self, chat_id: int) -> bool:
+        """Stop moderating a chat and drop its state."""
+
+    @abstractmethod
+    def list_chats(self) -> Dict[int, Dict[str, object]]:
+        """Return title, keywords and warnings for every moderated chat."""
+
+    @abstractmethod
+    def add_keywords(self, words: List[str]) -> int:
+        """Add global keywords (case-insensitive dedupe); return how many were new."""
+
+    @abstractmethod
+    def remove_keywords(self, words: List[str]) -> int:
+        """Remove global keywords case-insensitively; return how many were removed."""
+
+    @abstractmethod
+    def add_chat_keywords(self, chat_id: int, words: List[str]) -> int:
+        """Add keywords that apply to one chat only; return how many were new."""
+
+    @abstractmethod
+    def remove_chat_keywords(self, chat_id: int, words: List[str]) -> int:
+        """Remove chat-only keywords; return how many were removed."""
+
+    @abstractmethod
+    def add_exceptions(self, phrases: List[str]) -> int:
+        """Add allowlisted phrases (case-insensitive dedupe); return how many were new."""
+
+    @abstractmethod
+    def remove_exceptions(self, phrases: List[str]) -> int:
+        """Remove allowlisted phrases case-insensitively; return how many were removed."""
+
+    @abstractmethod
+    def set_chat_match_mode(self, chat_id: int, mode: str) -> bool:
+        """Set a chat's keyword match mode; return False if the chat is not moderated."""
+
+    @abstractmethod
+    def set_category(self, name: str, action: str) -> bool:
+        """Create a keyword category or change its action; return True if it is new."""
+
+    @abstractmethod
+    def remove_category(self, name: str) -> bool:
+        """Drop a category and uncategorize its keywords; return False if nothing changed."""
+
+    @abstractmethod
+    def add_category_keywords(self, name: str, words: List[str]) -> int:
+        """Add global keywords to a category (adding missing ones); return how many changed."""
+
+    @abstractmethod
+    def increment_warning(self, chat_id: int, user_id: int) -> int:
+        """Record one more warning and return the user's new active count."""
+
+    @abstractmethod
+    def reset_warnings(self, chat_id: int, user_id: int) -> bool:
+        """Clear a user's warnings; return False if there were none."""
+
+    @abstractmethod
+    def get_warning(self, chat_id: int, user_id: int) -> int:
+        """Return the user's active (not yet expired) warning count in a chat."""
+
+    @abstractmethod
+    def get_all_warnings(self, chat_id: int) -> Dict[int, int]:
+        """Return ``user_id -> active count`` for a chat."""
+
+    @abstractmethod
+    def expire_warnings(self, now: Optional[int] = None) -> int:
+        """Drop warnings older than the TTL; return how many were removed."""
+
+    def _warning_cutoff(self, now: Optional[float] = None) -> Optional[int]:
+        """Latest issue time of an expired warning, or None when warnings never expire."""
+        if not self._warning_ttl:
+            return None
+        return int(time.time() if now is None else now) - self._warning_ttl
+
+    def close(self) -> None:
+        """Flush pending state and release resources."""
+
+    def lock_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return wait-time counters per store lock (see :func:`bot.locks.lock_stats`)."""
+        return {}
+
+    def add_keyword(self, chat_id: int, keyword: str) -> bool:
+        # Backward compatibility: add to global list, ignore chat_id
+        return self.add_keywords([keyword]) > 0
+
+    def remove_keyword(self, chat_id: int, keyword: str) -> bool:
+        return self.remove_keywords([keyword]) > 0
+
+    def snapshot(self) -> StoreSnapshot:
+        # Snapshots are replaced wholesale, so reading the attribute without
+        # the lock always yields a complete, consistent view.
+        return self._snapshot
+
+    def _set_snapshot(
+        self,
+        keywords: Iterable[str],
+        chat_policies: Mapping[int, Mapping[str, object]],
+        rebuild_matcher: bool = False,
+        rebuild_chats: Iterable[int] = (),
+        exceptions: Iterable[str] = (),
+        categories: Optional[Mapping[str, str]] = None,
+        keyword_categories: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """Publish a new snapshot; callers must serialize writers.
+
+        Only the global matcher (``rebuild_matcher``) and the overlays of
+        ``rebuild_chats`` are recompiled; every other overlay is carried over
+        from the previous snapshot as is. ``exceptions`` are compiled into the
+        global matcher, so changing them needs ``rebuild_matcher``. Categories
+        are resolved after matching and never need a rebuild.
+        """
+        previous = self._snapshot
+        rebuild_chats = set(rebuild_chats)
+        keywords = tuple(keywords)
+        exceptions = tuple(exceptions)
+        keyword_version = previous.keyword_version if previous else 0
+        if rebuild_matcher or previous is None:
+            matcher = self._build_matcher(keywords, exceptions, previous)
+            keyword_version += 1
+        else:
+            matcher = previous.matcher
+        policies = {
+            chat_id: MappingProxyType(
+                {key: tuple(value) if isinstance(value, list) else value for key, value in payload.items()}
+            )
+            for chat_id, payload in chat_policies.items()
+        }
+        chat_matchers: Dict[int, KeywordMatcher] = {}
+        for chat_id, policy in policies.items():
+            chat_keywords = policy.get("keywords") or ()
+            if not chat_keywords:
+                # Chats without overlays share the global matcher; no per-chat cost.
+                continue
+            if previous is not None and chat_id not in rebuild_chats and chat_id in previous.chat_matchers:
+                chat_matchers[chat_id] = previous.chat_matchers[chat_id]
+            else:
+                chat_matchers[chat_id] = KeywordMatcher(chat_keywords, fuzzy=self._build_fuzzy(chat_keywords))
+        if rebuild_chats:
+            keyword_version += 1
+        self._snapshot = StoreSnapshot(
+            version=previous.version + 1 if previous else 1,
+            keyword_version=keyword_version,
+            moderated_chat_ids=frozenset(policies),
+            keywords=keywords,
+            exceptions=exceptions,
+            matcher=matcher,
+            chat_policies=MappingProxyType(policies),
+            chat_matchers=MappingProxyType(chat_matchers),
+            categories=MappingProxyType({**DEFAULT_CATEGORIES, **(categories or {})}),
+            keyword_categories=MappingProxyType(dict(keyword_categories or {})),
+        )
+
+    def _build_matcher(
+        self,
+        keywords: Tuple[str, ...],
+        exceptions: Tuple[str, ...],
+        previous: Optional[StoreSnapshot],
+    ) -> KeywordMatcher:
+        """Compile the global matcher, reusing the persisted automaton on start-up.
+
+        The automaton file is only read for the first snapshot and only if it
+        is stamped with the hash of exactly these keywords and exceptions;
+        otherwise the matcher is built from scratch and, on start-up, written
+        back for the next run.
+        """
+        fuzzy = self._build_fuzzy(keywords, previous)
+        path = self._matcher_cache_path
+        if path is None or previous is not None:
+            return KeywordMatcher(keywords, exceptions, fuzzy=fuzzy)
+        key = automaton_key(keywords, exceptions)
+        automaton = load_automaton(path, key)
+        if automaton is not None:
+            self._matcher_cache_key = key
+            return KeywordMatcher(keywords, exceptions, fuzzy=fuzzy, automaton=automaton)
+        matcher = KeywordMatcher(keywords, exceptions, fuzzy=fuzzy)
+        self._save_matcher_cache(matcher, key)
+        return matcher
+
+    def _save_matcher_cache(self, matcher: KeywordMatcher, key: bytes) -> None:
+        try:
+            save_automaton(self._matcher_cache_path, matcher, key)
+        except OSError as exc:
+            logger.warning("Could not persist keyword automaton to %s: %s", self._matcher_cache_path, exc)
+            return
+        self._matcher_cache_key = key
+
+    def _persist_matcher(self) -> None:
+        """Write the current global automaton to disk if the keyword set changed since start-up."""
+        snapshot = self._snapshot
+        if self._matcher_cache_path is None or snapshot is None:
+            return
+        key = automaton_key(snapshot.keywords, snapshot.exceptions)
+        if key != self._matcher_cache_key:
+            self._save_matcher_cache(snapshot.matcher, key)
+
+    def _build_fuzzy(
+        self,
+        keywords: Iterable[str],
+        previous: Optional[StoreSnapshot] = None,
+    ) -> Optional[FuzzyIndex]:
+        if self._fuzzy_distance <= 0:
+            return None
+        terms = fuzzy_terms(keywords)
+        base = previous.matcher.fuzzy if previous is not None else None
+        if base is not None and base.max_distance == self._fuzzy_distance:
+            # Incremental: only added/removed keywords are re-indexed
+            return base.updated(terms)
+        return FuzzyIndex.build(self._fuzzy_distance, terms)
+
+    def get_keywords(self, chat_id: int) -> Sequence[str]:
+        """Return the global keywords followed by the chat's own keywords."""
+        snapshot = self._snapshot
+        chat_keywords = snapshot.chat_keywords(chat_id)
+        if not chat_keywords:
+            return snapshot.keywords
+        return snapshot.keywords + chat_keywords
+
+    def get_chat_keywords(self, chat_id: int) -> Tuple[str, ...]:
+        return self._snapshot.chat_keywords(chat_id)
+
+    def get_chat_match_mode(self, chat_id: int) -> str:
+        return self._snapshot.chat_match_mode(chat_id)
+
+    @staticmethod
+    def _check_match_mode(mode: str) -> None:
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode '{mode}'")
+
+    @staticmethod
+    def _check_category(name: str, action: Optional[str] = None) -> None:
+        error = category_error(name, action)
+        if error is not None:
+            raise ValueError(error)
+
+    def _require_category(self, name: str) -> None:
+        if name not in self._snapshot.categories:
+            raise ValueError(f"Категория '{name}' не найдена")
+
+    def list_categories(self) -> Dict[str, str]:
+        return dict(self._snapshot.categories)
+
+    def list_category_keywords(self, name: str) -> List[str]:
+        snapshot = self._snapshot
+        return [kw for kw in snapshot.keywords if snapshot.keyword_categories.get(kw.casefold()) == name]
+
+    def get_matcher(self, chat_id: int) -> KeywordMatcher:
+        return self._snapshot.matcher
+
+    def get_chat_matcher(self, chat_id: int) -> Optional[KeywordMatcher]:
+        return self._snapshot.chat_matchers.get(chat_id)
+
+    def list_global_keywords(self) -> List[str]:
+        return list(self._snapshot.keywords)
+
+    def list_exceptions(self) -> List[str]:
+        return list(self._snapshot.exceptions)
+
+    def is_chat_moderated(self, chat_id: int) -> bool:
+        return chat_id in self._snapshot.moderated_chat_ids
+
+
+__all__ = ["BaseModerationStore", "StoreSnapshot"]
@@ -99,6 +99,18 @@ class TelegramAPI:
             params["until_date"] = until_date
         return self.call("banChatMember", params)
 
+    def restrict_chat_member(
+        self,
+        chat_id: int,
+        user_id: int,
+        permissions: Dict[str, bool],
+        until_date: Optional[int] = None,
+    ) -> Any:
+        params: Dict[str, Any] = {"chat_id": chat_id, "user_id": user_id, "permissions": permissions}
+        if until_date is not None:
+            params["until_date"] = until_date
+        return self.call("restrictChatMember", params)
+
     def unban_chat_member(self, chat_id: int, user_id: int) -> Any:
         return self.call("unbanChatMember", {"chat_id": chat_id, "user_id": user_id})
 
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+
+# Latin/Greek look-alikes folded onto the Cyrillic letters spammers swap them
+# for. Applied after casefold, so only lowercase forms are needed, and only
+# to words that could be disguised Cyrillic (see _fold_confusables).
+_CONFUSABLES = {
+    "a": "а", "b": "в", "c": "с", "e": "е", "h": "н", "k": "к", "m": "м",
+    "o": "о", "p": "р", "t": "т", "x": "х", "y": "у",
+    "á": "а", "à": "а", "ä": "а", "é": "е", "è": "е", "ë": "е", "ó": "о",
+    "ò": "о", "ö": "о", "ý": "у", "ÿ": "у",
+    "α": "а", "β": "в", "γ": "г", "ε": "е", "η": "п", "ι": "і", "κ": "к",
+    "μ": "м", "ν": "и", "ο": "о", "π": "п", "ρ": "р", "τ": "т", "υ": "у",
+    "χ": "х", "ω": "ш",
+    "@": "а", "$": "с",
+    "ё": "е",
+}
+
+# Digits that stand in for letters; folded only after the first letter of a
+# word ("х0р0ш0"), so numbers such as "100" or "500р" stay numbers.
+_DIGIT_CONFUSABLES = {"0": "о", "3": "з", "4": "ч", "6": "б"}
+
+# Zero-width and formatting characters that render as nothing.
+_INVISIBLE_RANGES = (
+    (0x00AD, 0x00AD),  # soft hyphen
+    (0x034F, 0x034F),  # combining grapheme joiner
+    (0x061C, 0x061C),  # arabic letter mark
+    (0x115F, 0x1160),  # hangul fillers
+    (0x17B4, 0x17B5),  # khmer inherent vowels
+    (0x180B, 0x180E),  # mongolian variation selectors / vowel separator
+    (0x200B, 0x200F),  # zero-width space/joiners, LRM/RLM
+    (0x202A, 0x202E),  # bidi embeddings and overrides
+    (0x2060, 0x206F),  # word joiner, invisible operators, bidi isolates
+    (0x3164, 0x3164),  # hangul filler
+    (0xFE00, 0xFE0F),  # variation selectors
+    (0xFEFF, 0xFEFF),  # zero-width no-break space / BOM
+    (0xFFA0, 0xFFA0),  # halfwidth hangul filler
+)
+
+# Combining marks left over after NFKC are stacked diacritics with no
+# precomposed form (Zalgo-style noise); precomposed letters such as "й"
+# survive because NFKC runs first.
+_COMBINING_RANGES = (
+    (0x0300, 0x036F),
+    (0x0483, 0x0489),
+    (0x1AB0, 0x1AFF),
+    (0x1DC0, 0x1DFF),
+    (0x20D0, 0x20FF),
+    (0xFE20, 0xFE2F),
+)
+
+
+def _build_table() -> Dict[int, Optional[str]]:
+    table: Dict[int, Optional[str]] = {}
+    for start, end in _INVISIBLE_RANGES + _COMBINING_RANGES:
+        for codepoint in range(start, end + 1):
+            table[codepoint] = None
+    return table
+
+
+_TRANSLATE_TABLE = _build_table()
+_CONFUSABLE_TABLE = str.maketrans(_CONFUSABLES)
+_DIGIT_TABLE = str.maketrans(_DIGIT_CONFUSABLES)
+
+_CONFUSABLE_RE = re.compile("[" + re.escape("".join(_CONFUSABLES)) + "]")
+# "@" and "$" stand in for letters, so they belong to the word around them
+_CONFUSABLE_WORD_RE = re.compile(r"[\w@$]+")
+_CYRILLIC_RE = re.compile("[\u0400-\u04ff]")
+
+# Single letters separated by spaces/punctuation: "с и с ь к и", "с.и.с.ь.к.и"
+_SPACED_LETTERS_RE = re.compile(r"(?<!\w)\w(?:[\s._\-*·|/\\]+\w(?!\w)){2,}")
+_SPACED_SEPARATORS_RE = re.compile(r"[\s._\-*·|/\\]+")
+# Plain-space runs shorter than this are left alone: "я и в лес" is real Russian
+_MIN_SPACED_RUN = 4
+_LETTER_RE = re.compile(r"[^\W\d_]")
+_WORD_WITH_DIGITS_RE = re.compile(r"\w*\d\w*")
+# Only runs of three or more collapse, so doubled letters ("касса", "сс") survive
+_REPEATED_LETTERS_RE = re.compile(r"([^\W\d_])\1{2,}")
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _fold_confusables(match: "re.Match[str]") -> str:
+    # Plain Latin words ("hello") stay as they are; a word is folded when it
+    # already mixes in Cyrillic ("xуй") or every letter has a Cyrillic twin ("cyka").
+    word = match.group()
+    letters = [ch for ch in word if ch.isalpha()]
+    if not letters:
+        return word
+    if _CYRILLIC_RE.search(word) or all(ch in _CONFUSABLES for ch in letters):
+        return word.translate(_CONFUSABLE_TABLE)
+    return word
+
+
+def _join_spaced(match: "re.Match[str]") -> str:
+    run = match.group()
+    joined = _SPACED_SEPARATORS_RE.sub("", run)
+    if not _LETTER_RE.search(joined):
+        # Spaced digits ("1 2 3") are not obfuscated words
+        return run
+    if len(joined) < _MIN_SPACED_RUN and set(run) - set(joined) == {" "}:
+        return run
+    return joined
+
+
+def _fold_digits(match: "re.Match[str]") -> str:
+    # Digits before the first letter are a number with a unit ("500р", "10кг")
+    word = match.group()
+    letter = _LETTER_RE.search(word)
+    if letter is None:
+        return word
+    return word[:letter.start()] + word[letter.start():].translate(_DIGIT_TABLE)
+
+
+def normalize_text(text: str) -> str:
+    """Fold text into the canonical form used for keyword matching.
+
+    NFKC-composes and casefolds, drops invisible characters and stray
+    combining marks, and maps look-alike letters to Cyrillic in words that
+    contain Cyrillic or consist of look-alikes only. Spaced-out letters are
+    joined (runs of plain-space separated letters only from four letters
+    on), digits that look like letters are folded after the first letter of
+    a word, and runs of three or more of the same letter are collapsed to
+    one. Keywords go through the same function when the matcher is
+    compiled, so both sides always agree.
+    """
+    if not text:
+        return ""
+    normalized = unicodedata.normalize("NFKC", text).casefold().translate(_TRANSLATE_TABLE)
+    if _CONFUSABLE_RE.search(normalized):
+        normalized = _CONFUSABLE_WORD_RE.sub(_fold_confusables, normalized)
+    normalized = _SPACED_LETTERS_RE.sub(_join_spaced, normalized)
+    normalized = _WORD_WITH_DIGITS_RE.sub(_fold_digits, normalized)
+    return _REPEATED_LETTERS_RE.sub(r"\1", normalized)
+
+
+def tokenize(normalized: str) -> List[Tuple[str, int]]:
+    """Split normalized text into ``(token, offset)`` word tokens."""
+    return [(match.group(), match.start()) for match in _TOKEN_RE.finditer(normalized)]
+
+
+__all__ = ["normalize_text", "tokenize"]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class VerdictCache:
+    """Bounded LRU cache of keyword verdicts for repeated message texts.
+
+    Entries are keyed by a digest of the normalized text and tagged with the
+    keyword-set version they were computed for. When the store publishes a new
+    keyword version the cache drops everything, so edits made through
+    ``add_keywords``/``remove_keywords`` can never serve a stale verdict.
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[str, ...]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key_for(normalized_text: str) -> bytes:
+        return hashlib.blake2b(normalized_text.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, version: int, key: bytes) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            verdict = self._entries.get(key)
+            if verdict is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return verdict
+
+    def put(self, version: int, key: bytes, verdict: Tuple[str, ...]) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            if version != self._version:
+                # Computed against an older keyword set; not worth keeping.
+                return
+            self._entries[key] = verdict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self._hits + self._misses
+        return self._hits / total if total else 0.0
+
+
+__all__ = ["VerdictCache"]
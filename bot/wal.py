@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteAheadLog:
+    """Append-only log of store mutations, one compact JSON record per line.
+
+    Every record carries a monotonically increasing sequence number (``"s"``)
+    so replay can skip records already folded into the snapshot, which keeps
+    recovery correct if the process dies halfway through a compaction.
+    """
+
+    def __init__(self, path: Path, start_seq: int = 0) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._seq = start_seq
+        self._fh = self._path.open("a", encoding="utf-8")
+        self._size = self._fh.tell()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def append(self, record: Dict[str, Any], fsync: bool = False) -> int:
+        with self._lock:
+            self._seq += 1
+            record["s"] = self._seq
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+            self._fh.write(line)
+            self._fh.flush()
+            if fsync:
+                os.fsync(self._fh.fileno())
+            self._size += len(line.encode("utf-8"))
+            return self._seq
+
+    def sync(self) -> None:
+        """Force appended records to stable storage."""
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+
+    def rotate(self, rotated_path: Path) -> None:
+        """Move the current log aside and continue appending to a fresh file."""
+        with self._lock:
+            self._fh.close()
+            self._path.replace(rotated_path)
+            self._fh = self._path.open("a", encoding="utf-8")
+            self._size = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.close()
+
+    @staticmethod
+    def read(path: Path, after_seq: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield records with a sequence number greater than ``after_seq``."""
+        if not path.exists():
+            return
+        with path.open("r", encoding="utf-8") as fh:
+            for lineno, line in enumerate(fh, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final write after a crash; nothing after it is valid.
+                    logger.warning("Ignoring truncated WAL record at %s:%s", path, lineno)
+                    return
+                if int(record.get("s", 0)) > after_seq:
+                    yield record
+
+
+class WALCompactor:
+    """Background thread that folds the log into a snapshot past a size threshold."""
+
+    def __init__(self, compact: Callable[[], None], name: str = "wal-compactor") -> None:
+        self._compact = compact
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def request(self) -> None:
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            try:
+                self._compact()
+            except Exception:  # pragma: no cover - defensive logging
+                logger.exception("WAL compaction failed")
+
+
+__all__ = ["WriteAheadLog", "WALCompactor"]
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import heapq
+import threading
+from bisect import bisect_right
+from typing import Dict, Hashable, List, Optional, Set
+
+
+# Width of one expiry bucket; warnings are removed at most this late
+BUCKET_SECONDS = 3600
+
+
+def active_count(timestamps: List[int], cutoff: Optional[int]) -> int:
+    """Number of ``timestamps`` (ascending) issued after ``cutoff``; None keeps all."""
+    if cutoff is None:
+        return len(timestamps)
+    return len(timestamps) - bisect_right(timestamps, cutoff)
+
+
+def drop_expired(timestamps: List[int], cutoff: Optional[int]) -> int:
+    """Remove timestamps at or before ``cutoff`` in place; return how many."""
+    if cutoff is None:
+        return 0
+    expired = bisect_right(timestamps, cutoff)
+    if expired:
+        del timestamps[:expired]
+    return expired
+
+
+class ExpiryWheel:
+    """Time buckets of keys that hold warnings issued within the bucket.
+
+    Each warning files its key under ``timestamp // bucket_seconds``; bucket
+    ids are kept in a heap. :meth:`pop_expired` only visits buckets that
+    ended before the cutoff, so an expiry pass costs O(expired keys) rather
+    than a scan of every chat. A key appears once per bucket it has
+    warnings in and may have been reset since; callers re-check.
+    """
+
+    def __init__(self, bucket_seconds: int = BUCKET_SECONDS) -> None:
+        self._bucket_seconds = bucket_seconds
+        self._buckets: Dict[int, Set[Hashable]] = {}
+        self._heap: List[int] = []
+        # Warnings of different chats are recorded under different stripes
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def add(self, key: Hashable, timestamp: int) -> None:
+        bucket = timestamp // self._bucket_seconds
+        with self._lock:
+            keys = self._buckets.get(bucket)
+            if keys is None:
+                keys = self._buckets[bucket] = set()
+                heapq.heappush(self._heap, bucket)
+            keys.add(key)
+
+    def pop_expired(self, cutoff: int) -> Set[Hashable]:
+        """Remove and return the keys of every bucket that ends at or before ``cutoff``."""
+        last = (cutoff + 1) // self._bucket_seconds
+        expired: Set[Hashable] = set()
+        with self._lock:
+            while self._heap and self._heap[0] < last:
+                expired |= self._buckets.pop(heapq.heappop(self._heap))
+        return expired
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._heap.clear()
+
+
+__all__ = ["BUCKET_SECONDS", "ExpiryWheel", "active_count", "drop_expired"]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple
+
+from .text_normalize import normalize_text, tokenize
+
+
+class WordMatcher:
+    """Whole-word keyword lookup over a hash of normalized tokens.
+
+    Keywords are split into tokens once at build time and indexed by their
+    first token, so matching a text is one dict lookup per token of the text.
+    Multi-word keywords additionally compare the following tokens. Unlike
+    substring matching, "попа" does not fire inside "попал".
+    """
+
+    def __init__(self, words: Iterable[Tuple[str, str]]) -> None:
+        # words: (keyword as entered, text to match)
+        # first token -> [(keyword, remaining tokens)]
+        self._index: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {}
+        self._keywords: List[str] = []
+        seen = set()
+        for keyword, body in words:
+            tokens = tuple(token for token, _ in tokenize(normalize_text(body)))
+            if not tokens or tokens in seen:
+                continue
+            seen.add(tokens)
+            self._index.setdefault(tokens[0], []).append((keyword, tokens[1:]))
+            self._keywords.append(keyword)
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def __bool__(self) -> bool:
+        return bool(self._keywords)
+
+    @property
+    def keywords(self) -> List[str]:
+        return list(self._keywords)
+
+    def find_all(self, tokens: List[Tuple[str, int]]) -> List[Tuple[str, int, int]]:
+        """Return ``(keyword, start, end)`` for every keyword found in ``tokens``."""
+        if not self._keywords:
+            return []
+        index = self._index
+        matches: List[Tuple[str, int, int]] = []
+        for position, (token, offset) in enumerate(tokens):
+            candidates = index.get(token)
+            if candidates is None:
+                continue
+            for keyword, rest in candidates:
+                if not rest:
+                    matches.append((keyword, offset, offset + len(token)))
+                elif len(rest) <= len(tokens) - position - 1 and all(
+                    tokens[position + 1 + i][0] == part for i, part in enumerate(rest)
+                ):
+                    last, last_offset = tokens[position + len(rest)]
+                    matches.append((keyword, offset, last_offset + len(last)))
+        return matches
+
+
+__all__ = ["WordMatcher"]
@@ -2,12 +2,21 @@ from __future__ import annotations
 
 import logging
 import os
+import sys
+import time
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
 
 from bot.config import BotConfig, ConfigError
 from bot.data_store import ModerationStore
 from bot.moderation_bot import ModerationBot
+from bot.sqlite_store import SQLiteModerationStore
+from bot.store_base import BaseModerationStore
 from bot.telegram_api import TelegramAPI
 
 
@@ -42,6 +51,36 @@ def build_logger() -> None:
     )
 
 
+def peak_rss_mib() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_store(config: BotConfig) -> BaseModerationStore:
+    if config.storage_backend == "sqlite":
+        # The JSON state file is imported once into a fresh database.
+        return SQLiteModerationStore(
+            config.sqlite_path,
+            migrate_from=config.storage_path,
+            fuzzy_distance=config.fuzzy_distance,
+            warning_ttl=config.warning_ttl_days * 86400,
+        )
+    return ModerationStore(
+        config.storage_path,
+        mode=config.storage_mode,
+        wal_compact_bytes=config.wal_compact_bytes,
+        durability=config.durability,
+        flush_interval_ms=config.flush_interval_ms,
+        flush_max_pending=config.flush_max_pending,
+        fuzzy_distance=config.fuzzy_distance,
+        state_format=config.state_format,
+        warning_ttl=config.warning_ttl_days * 86400,
+    )
+
+
 def main() -> None:
     load_env_file()
     build_logger()
@@ -51,10 +90,20 @@ def main() -> None:
         logging.getLogger("bottgmoder").error("Configuration error: %s", exc)
         raise SystemExit(1) from exc
 
-    store = ModerationStore(config.storage_path)
+    started = time.perf_counter()
+    store = build_store(config)
+    peak = peak_rss_mib()
+    logging.getLogger("bottgmoder").info(
+        "State loaded in %.3f s, peak RSS %s",
+        time.perf_counter() - started,
+        f"{peak:.1f} MiB" if peak is not None else "unknown",
+    )
     api = TelegramAPI(config.token)
     bot = ModerationBot(config, store, api)
-    bot.run_forever()
+    try:
+        bot.run_forever()
+    finally:
+        store.close()
 
 
 if __name__ == "__main__":